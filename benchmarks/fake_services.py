@@ -0,0 +1,176 @@
+"""
+离线基准测试用的Google Play和Gemini替身
+替换 play_store_monitor 中的 fetch_app_details、fetch_review_page、create_gemini_model，
+评论按页即时生成（同一偏移量每次生成相同内容），不访问网络，也不在内存中保存完整评论集
+
+用法:
+    import play_store_monitor
+    from fake_services import FakeServices
+
+    services = FakeServices(reviews_per_app=100_000, latency=0.05)
+    services.install(play_store_monitor)
+"""
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+# 合成评论的词表大小和每条评论的词数范围
+VOCAB_SIZE = 5000
+WORDS_PER_REVIEW = (3, 40)
+
+# 评分分布（1-5星）
+SCORE_WEIGHTS = [15, 8, 10, 22, 45]
+
+# 预先生成的评论模板数；第index条评论使用第 index % TEMPLATE_COUNT 个模板，
+# 生成评论的开销因此只是一次字典复制，不会计入被测代码的耗时
+TEMPLATE_COUNT = 10000
+
+
+class FakeContinuationToken:
+    """
+    与google_play_scraper的continuation token相同的接口（只用到token属性）
+    """
+
+    def __init__(self, token):
+        self.token = token
+
+
+# 流式生成时每块的字符数
+STREAM_CHUNK_CHARS = 40
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    Gemini生成模型替身：等待固定延迟后返回固定长度的文本（stream=True时分块返回）
+    """
+
+    def __init__(self, services):
+        self.services = services
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.services.count('gemini_calls')
+        self.services.count('prompt_chars', len(prompt))
+        if self.services.gemini_latency:
+            time.sleep(self.services.gemini_latency)
+
+        text = "离线基准测试生成的分析文本。" * 20
+        if stream:
+            return [FakeResponse(text[start:start + STREAM_CHUNK_CHARS])
+                    for start in range(0, len(text), STREAM_CHUNK_CHARS)]
+        return FakeResponse(text)
+
+
+class FakeServices:
+    """
+    可配置的Google Play和Gemini替身
+
+    参数:
+        reviews_per_app: 每个应用在更新日期之后的评论条数
+        latency: 每次Google Play请求（详情页、评论分页）的模拟延迟（秒）
+        gemini_latency: 每次Gemini调用的模拟延迟（秒）
+        page_size: 每页最多返回的评论条数（None表示按调用方请求的条数）
+        update_age_days: 应用最后更新距今的天数，默认落在7-30天的分析区间内
+        seed: 随机种子
+    """
+
+    def __init__(self, reviews_per_app=1000, latency=0.0, gemini_latency=0.0, page_size=None,
+                 update_age_days=14, seed=0):
+        self.reviews_per_app = reviews_per_app
+        self.latency = latency
+        self.gemini_latency = gemini_latency
+        self.page_size = page_size
+        self.seed = seed
+        self.now = datetime.now().replace(microsecond=0)
+        self.updated = self.now - timedelta(days=update_age_days)
+        # 更新后的评论均匀分布在更新日期和现在之间，最新优先
+        self.interval = (self.now - self.updated).total_seconds() / max(reviews_per_app, 1)
+
+        self.templates = self.make_templates(random.Random(seed))
+
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset_counters(self):
+        with self._lock:
+            self.counters = {}
+
+    def install(self, module):
+        """
+        替换模块中的网络访问入口
+        """
+        module.fetch_app_details = self.app
+        module.fetch_review_page = self.reviews
+        module.create_gemini_model = lambda api_key: FakeGeminiModel(self)
+
+    def app(self, app_id):
+        self.count('app_calls')
+        if self.latency:
+            time.sleep(self.latency)
+
+        return {
+            'title': f'Benchmark {app_id}',
+            'version': '1.0.0',
+            'updated': int(self.updated.timestamp()),
+        }
+
+    def reviews(self, app_id, lang='en', country='us', count=100, continuation_token=None):
+        self.count('review_pages')
+        if self.latency:
+            time.sleep(self.latency)
+
+        offset = continuation_token.token if continuation_token is not None else 0
+        size = min(count, self.page_size) if self.page_size else count
+        # 更新日期之后的评论之外再多提供一页更早的评论，让调用方在跨过更新日期时停止
+        end = min(offset + size, self.reviews_per_app + size)
+        page = [self.make_review(app_id, index) for index in range(offset, end)]
+        self.count('reviews', len(page))
+
+        next_token = end if end < self.reviews_per_app + size else None
+        return page, FakeContinuationToken(next_token)
+
+    @staticmethod
+    def make_templates(rng):
+        """
+        生成评论模板：词频服从近似Zipf分布，评分和点赞数服从偏态分布
+        """
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        vocab = [''.join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(VOCAB_SIZE)]
+        cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(VOCAB_SIZE)))
+
+        templates = []
+        for _ in range(TEMPLATE_COUNT):
+            words = rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(*WORDS_PER_REVIEW))
+            templates.append({
+                'userName': 'Benchmark User',
+                'userImage': 'https://play-lh.googleusercontent.com/a/benchmark-avatar',
+                'content': ' '.join(words).capitalize() + '.',
+                'score': rng.choices(range(1, 6), weights=SCORE_WEIGHTS)[0],
+                'thumbsUpCount': int(rng.paretovariate(1.5)) - 1,
+                'reviewCreatedVersion': '1.0.0',
+                'replyContent': None,
+                'repliedAt': None,
+                'appVersion': '1.0.0',
+            })
+
+        return templates
+
+    def make_review(self, app_id, index):
+        """
+        第index条评论（与google_play_scraper相同的字段），时间按index从新到旧排列
+        """
+        review = dict(self.templates[index % TEMPLATE_COUNT])
+        review['reviewId'] = f'{app_id}:{index}'
+        review['at'] = self.now - timedelta(seconds=int((index + 1) * self.interval))
+
+        return review
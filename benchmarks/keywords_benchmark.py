@@ -0,0 +1,106 @@
+"""
+关键词统计基准测试：对比原有实现（逐条正则 + 全量词列表 + Counter）
+与 KeywordExtractor 的分批实现在不同评论规模下的耗时和峰值内存
+
+用法:
+    python benchmarks/keywords_benchmark.py
+    python benchmarks/keywords_benchmark.py --sizes 10000 100000 --memory
+"""
+import argparse
+import itertools
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from play_store_monitor import STOP_WORDS, KeywordExtractor  # noqa: E402
+
+
+def legacy_top_keywords(contents, top_n=20):
+    """
+    重构前 analyze_reviews 中的关键词统计实现
+    """
+    all_words = []
+    for content in contents:
+        if not isinstance(content, str):
+            continue
+        words = re.findall(r'\b[a-z]+\b', content.lower())
+        all_words.extend([w for w in words if w not in STOP_WORDS and len(w) > 3])
+
+    return dict(Counter(all_words).most_common(top_n))
+
+
+def make_synthetic_reviews(count, vocab_size=20000, seed=0):
+    """
+    生成合成评论文本：词频服从近似Zipf分布，并混入停用词和标点
+    """
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocab = [''.join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(vocab_size)]
+    vocab += sorted(STOP_WORDS)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocab))))
+
+    texts = []
+    for _ in range(count):
+        words = rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(3, 60))
+        texts.append(' '.join(words).capitalize() + rng.choice(['.', '!', '?', ' :(', '']))
+
+    return texts
+
+
+def measure(func, texts, track_memory):
+    if track_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    result = func(texts)
+    elapsed = time.perf_counter() - start
+
+    peak = None
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词统计基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="评论条数（默认: 10000 100000 1000000）")
+    parser.add_argument('--memory', action='store_true',
+                        help="同时用tracemalloc测量峰值内存（会明显拖慢耗时）")
+    args = parser.parse_args()
+
+    extractor = KeywordExtractor()
+    implementations = [
+        ('原实现', legacy_top_keywords),
+        ('KeywordExtractor', lambda texts: extractor.top(texts, 20)),
+    ]
+
+    print(f"{'评论数':>10} {'实现':<18} {'耗时(秒)':>10} {'峰值内存(MB)':>14}")
+    print("-" * 56)
+
+    for size in args.sizes:
+        texts = make_synthetic_reviews(size)
+        results = []
+
+        for name, func in implementations:
+            result, elapsed, peak = measure(func, texts, args.memory)
+            results.append(result)
+            peak_text = f"{peak / 1024 / 1024:.1f}" if peak is not None else '-'
+            print(f"{size:>10} {name:<18} {elapsed:>10.3f} {peak_text:>14}")
+
+        if results[0] != results[1]:
+            print("⚠️  两种实现的结果不一致")
+
+        del texts
+
+
+if __name__ == "__main__":
+    main()
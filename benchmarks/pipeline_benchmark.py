@@ -0,0 +1,268 @@
+"""
+离线流水线基准测试：用 fake_services 替换Google Play和Gemini，
+测量 run_full_analysis 各阶段以及 MultiAppMonitor.analyze_all_apps 的耗时和峰值内存，
+结果保存为JSON，可用 --baseline 与之前的结果对比以发现性能回退
+
+用法:
+    python benchmarks/pipeline_benchmark.py
+    python benchmarks/pipeline_benchmark.py --reviews 1000 100000 --apps 1 50 --memory
+    python benchmarks/pipeline_benchmark.py --latency 0.05 --workers 8 --baseline results_old.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+import play_store_monitor  # noqa: E402
+from fake_services import FakeServices  # noqa: E402
+
+# 对比基线时，耗时增加超过该比例视为回退
+REGRESSION_THRESHOLD = 0.2
+
+
+class StageTimer:
+    """
+    逐阶段记录耗时和（可选的）tracemalloc峰值内存
+    """
+
+    def __init__(self, track_memory):
+        self.track_memory = track_memory
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {'seconds': round(time.perf_counter() - start, 4)}
+            if self.track_memory:
+                record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            self.stages[name] = record
+
+
+def monitor_options(args):
+    return {
+        'analysis_mode': 'update',
+        'keyword_extractor': play_store_monitor.KeywordExtractor(),
+        'streaming': args.streaming,
+        'duplicate_detector': play_store_monitor.NearDuplicateDetector() if args.dedupe else None,
+        'chart_format': args.chart_format,
+        'force_render': True,
+    }
+
+
+def benchmark_single_app(args, review_count):
+    """
+    按 run_full_analysis 的顺序逐阶段执行单个应用的分析
+    """
+    services = FakeServices(reviews_per_app=review_count, latency=args.latency,
+                            gemini_latency=args.gemini_latency, page_size=args.page_size)
+    services.install(play_store_monitor)
+
+    monitor = play_store_monitor.PlayStoreMonitor('com.benchmark.single', gemini_api_key='offline-benchmark',
+                                                  **monitor_options(args))
+    timer = StageTimer(args.memory)
+    start = time.perf_counter()
+
+    with timer.stage('app_details'):
+        monitor.get_last_update_date()
+        monitor.check_update_threshold()
+    with timer.stage('fetch_reviews'):
+        if args.streaming:
+            monitor.stream_reviews_since_update()
+        else:
+            monitor.get_reviews_since_update()
+    with timer.stage('analyze'):
+        analysis, review_analysis = monitor.analyze_reviews()
+    with timer.stage('prepare_research'):
+        research_data = monitor.prepare_research_data(analysis, review_analysis)
+    with timer.stage('gemini'):
+        gemini_analysis = monitor.call_gemini_api(research_data)
+    with timer.stage('newsletter'):
+        monitor.write_newsletter(research_data, gemini_analysis)
+    with timer.stage('charts'):
+        monitor.create_visualizations()
+
+    return {
+        'reviews': review_count,
+        'total_seconds': round(time.perf_counter() - start, 4),
+        'stages': timer.stages,
+        'counters': services.counters,
+    }
+
+
+def benchmark_batch(args, app_count):
+    """
+    通过 MultiAppMonitor.analyze_all_apps 批量分析app_count个应用
+    """
+    services = FakeServices(reviews_per_app=args.batch_reviews, latency=args.latency,
+                            gemini_latency=args.gemini_latency, page_size=args.page_size)
+    services.install(play_store_monitor)
+
+    monitor = play_store_monitor.MultiAppMonitor(
+        gemini_api_key='offline-benchmark',
+        max_workers=args.workers,
+        requests_per_second=args.rate,
+        stage_workers={'analyze': args.analyze_workers, 'llm': args.llm_workers,
+                       'render': args.render_workers},
+        render_processes=args.render_processes,
+        portfolio=args.portfolio,
+        **monitor_options(args)
+    )
+    monitor.app_ids = [f'com.benchmark.app{i}' for i in range(app_count)]
+
+    timer = StageTimer(args.memory)
+    with timer.stage('analyze_all_apps'):
+        monitor.analyze_all_apps()
+    record = timer.stages['analyze_all_apps']
+
+    statuses = {}
+    for result in monitor.results.values():
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+
+    return dict(record, apps=app_count, reviews_per_app=args.batch_reviews,
+                apps_per_second=round(app_count / record['seconds'], 3) if record['seconds'] else None,
+                statuses=statuses, counters=services.counters)
+
+
+def compare_with_baseline(results, baseline_path):
+    """
+    与基线结果逐项对比耗时，返回回退项列表
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def flatten(data):
+        timings = {}
+        for run in data.get('single_app', []):
+            for stage, record in run['stages'].items():
+                timings[f"single[{run['reviews']}].{stage}"] = record['seconds']
+        for run in data.get('batch', []):
+            timings[f"batch[{run['apps']}x{run['reviews_per_app']}]"] = run['seconds']
+        return timings
+
+    current = flatten(results)
+    previous = flatten(baseline)
+    regressions = []
+
+    print(f"\n与基线对比: {baseline_path}")
+    print(f"{'项目':<40} {'基线(秒)':>10} {'本次(秒)':>10} {'变化':>8}")
+    print("-" * 72)
+    for key, seconds in current.items():
+        if key not in previous:
+            continue
+        before = previous[key]
+        change = (seconds - before) / before if before else 0.0
+        flag = ''
+        # 极短的阶段受噪声影响大，不参与回退判断
+        if change > REGRESSION_THRESHOLD and seconds - before > 0.05:
+            flag = ' ⚠️'
+            regressions.append(key)
+        print(f"{key:<40} {before:>10.3f} {seconds:>10.3f} {change:>+7.0%}{flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线流水线基准测试")
+    parser.add_argument('--reviews', type=int, nargs='*', default=[1_000, 100_000, 1_000_000],
+                        help="单应用测试的评论条数（默认: 1000 100000 1000000）")
+    parser.add_argument('--apps', type=int, nargs='*', default=[1, 50, 500],
+                        help="批量测试的应用数（默认: 1 50 500）")
+    parser.add_argument('--batch-reviews', type=int, default=1000,
+                        help="批量测试中每个应用的评论条数（默认: 1000）")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="每次Google Play请求的模拟延迟，秒（默认: 0）")
+    parser.add_argument('--gemini-latency', type=float, default=0.0,
+                        help="每次Gemini调用的模拟延迟，秒（默认: 0）")
+    parser.add_argument('--page-size', type=int, default=None,
+                        help="替身每页最多返回的评论数（默认: 按请求的条数）")
+    parser.add_argument('--rate', type=float, default=1000,
+                        help="批量测试的请求限速，次/秒（默认: 1000，基本不限速）")
+    parser.add_argument('--workers', type=int, default=1, help="抓取并发数（默认: 1）")
+    parser.add_argument('--analyze-workers', type=int, default=1, help="分析并发数（默认: 1）")
+    parser.add_argument('--llm-workers', type=int, default=1, help="LLM并发数（默认: 1）")
+    parser.add_argument('--render-workers', type=int, default=1, help="渲染并发数（默认: 1）")
+    parser.add_argument('--render-processes', type=int, default=0, help="渲染进程数（默认: 0）")
+    parser.add_argument('--chart-format', choices=list(play_store_monitor.CHART_FORMATS), default='png',
+                        help="图表格式（默认: png）")
+    parser.add_argument('--streaming', action='store_true', help="使用流式分析模式")
+    parser.add_argument('--dedupe', action='store_true', help="分析前合并近似重复评论")
+    parser.add_argument('--portfolio', action='store_true', help="批量测试同时输出组合分析")
+    parser.add_argument('--memory', action='store_true',
+                        help="同时用tracemalloc测量峰值内存（会明显拖慢耗时）")
+    parser.add_argument('--output', default=None,
+                        help="结果JSON路径（默认: pipeline_benchmark_<时间戳>.json）")
+    parser.add_argument('--baseline', default=None, help="用于对比的历史结果JSON")
+    parser.add_argument('--verbose', action='store_true', help="显示被测程序的输出")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or f"pipeline_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'verbose')},
+        'single_app': [],
+        'batch': [],
+    }
+
+    if args.memory:
+        tracemalloc.start()
+
+    # 被测程序把Newsletter和图表写到当前目录，放在临时目录中以免污染工作区
+    with tempfile.TemporaryDirectory(prefix='pipeline_benchmark_') as work_dir, \
+            open(os.devnull, 'w') as devnull:
+        os.chdir(work_dir)
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+
+        print(f"{'测试':<28} {'耗时(秒)':>10} {'峰值内存(MB)':>14}")
+        print("-" * 56)
+
+        for review_count in args.reviews:
+            with quiet:
+                run = benchmark_single_app(args, review_count)
+            results['single_app'].append(run)
+            for stage, record in run['stages'].items():
+                print(f"{f'{review_count}条 {stage}':<28} {record['seconds']:>10.3f} "
+                      f"{record.get('peak_mb', '-'):>14}")
+            print(f"{f'{review_count}条 合计':<28} {run['total_seconds']:>10.3f}")
+
+        for app_count in args.apps:
+            with quiet:
+                run = benchmark_batch(args, app_count)
+            results['batch'].append(run)
+            print(f"{f'{app_count}个应用 x {args.batch_reviews}条':<28} {run['seconds']:>10.3f} "
+                  f"{run.get('peak_mb', '-'):>14}   {run['statuses']}")
+
+    if args.memory:
+        tracemalloc.stop()
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ 结果已保存至: {output}")
+
+    if baseline:
+        regressions = compare_with_baseline(results, baseline)
+        if regressions:
+            print(f"\n⚠️  {len(regressions)}项耗时超过基线{REGRESSION_THRESHOLD:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,151 +1,2275 @@
 import sys
 import subprocess
+import argparse
+import importlib.util
+
+
+# 必需的依赖包：导入名 -> pip包名
+REQUIRED_PACKAGES = {
+    'requests': 'requests',
+    'bs4': 'beautifulsoup4',
+    'google_play_scraper': 'google-play-scraper',
+    'pandas': 'pandas',
+    'matplotlib': 'matplotlib',
+    'google.generativeai': 'google-generativeai'
+}
+
+
+def find_missing_dependencies():
+    """
+    只查找模块是否存在而不导入，用于启动时的快速检查
+    """
+    missing = []
+    for import_name, package_name in REQUIRED_PACKAGES.items():
+        try:
+            found = importlib.util.find_spec(import_name) is not None
+        except ImportError:
+            found = False
+        if not found:
+            missing.append(package_name)
+    return missing
 
 
 def check_and_install_dependencies():
     """
-    检查并安装必需的依赖包
+    检查并安装必需的依赖包（check-deps 子命令）
     """
-    required_packages = {
-        'requests': 'requests',
-        'bs4': 'beautifulsoup4',
-        'google_play_scraper': 'google-play-scraper',
-        'pandas': 'pandas',
-        'matplotlib': 'matplotlib',
-        'google.generativeai': 'google-generativeai'
-    }
+    required_packages = REQUIRED_PACKAGES
 
     missing_packages = []
     installed_packages = []
 
-    print("\n" + "=" * 80)
-    print("检查系统依赖...")
-    print("=" * 80)
+    print("\n" + "=" * 80)
+    print("检查系统依赖...")
+    print("=" * 80)
+
+    # 检查Python版本
+    python_version = sys.version_info
+    print(f"\nPython版本: {python_version.major}.{python_version.minor}.{python_version.micro}")
+
+    if python_version.major < 3 or (python_version.major == 3 and python_version.minor < 8):
+        print("❌ 错误：需要Python 3.8或更高版本")
+        print("请访问 https://www.python.org/downloads/ 下载最新版本")
+        sys.exit(1)
+    else:
+        print("✓ Python版本符合要求")
+
+    print("\n检查依赖包:")
+    print("-" * 80)
+
+    for import_name, package_name in required_packages.items():
+        try:
+            module = __import__(import_name)
+            version = getattr(module, '__version__', 'unknown')
+            print(f"✓ {package_name:30s} 版本: {version}")
+            installed_packages.append(package_name)
+        except ImportError:
+            print(f"✗ {package_name:30s} 未安装")
+            missing_packages.append(package_name)
+
+    print("-" * 80)
+    print(f"已安装: {len(installed_packages)}/{len(required_packages)}")
+
+    if missing_packages:
+        print("\n" + "=" * 80)
+        print(f"⚠️  发现 {len(missing_packages)} 个缺失的依赖包")
+        print("=" * 80)
+
+        for i, pkg in enumerate(missing_packages, 1):
+            print(f"  {i}. {pkg}")
+
+        print("\n选项:")
+        print("  [y] 自动安装缺失的包（推荐）")
+        print("  [n] 手动安装（程序将退出）")
+        print("  [q] 退出程序")
+
+        while True:
+            install_choice = input("\n请选择 (y/n/q): ").strip().lower()
+
+            if install_choice == 'q':
+                print("\n程序已退出。")
+                sys.exit(0)
+
+            elif install_choice == 'n':
+                print("\n请手动安装缺失的包:")
+                print("\n方法1 - 一键安装全部:")
+                print(f"  pip install {' '.join(missing_packages)}")
+                print("\n方法2 - 使用requirements.txt:")
+                print("  pip install -r requirements.txt")
+                print("\n安装完成后，请重新运行程序。")
+                sys.exit(1)
+
+            elif install_choice == 'y':
+                print("\n" + "=" * 80)
+                print("开始自动安装依赖包...")
+                print("=" * 80)
+
+                failed_packages = []
+
+                for i, pkg in enumerate(missing_packages, 1):
+                    try:
+                        print(f"\n[{i}/{len(missing_packages)}] 正在安装 {pkg}...")
+                        result = subprocess.check_output(
+                            [sys.executable, "-m", "pip", "install", pkg],
+                            stderr=subprocess.STDOUT,
+                            text=True
+                        )
+                        print(f"✓ {pkg} 安装成功")
+                    except subprocess.CalledProcessError as e:
+                        print(f"✗ {pkg} 安装失败")
+                        print(f"错误信息: {e.output}")
+                        failed_packages.append(pkg)
+
+                print("\n" + "=" * 80)
+
+                if failed_packages:
+                    print(f"⚠️  {len(failed_packages)} 个包安装失败:")
+                    for pkg in failed_packages:
+                        print(f"  - {pkg}")
+                    print("\n请尝试手动安装:")
+                    print(f"  pip install {' '.join(failed_packages)}")
+
+                    continue_choice = input("\n是否继续运行程序？(y/n): ").strip().lower()
+                    if continue_choice != 'y':
+                        sys.exit(1)
+                else:
+                    print("✓ 所有依赖包安装成功！")
+
+                print("=" * 80)
+                break
+            else:
+                print("❌ 无效输入，请输入 y, n 或 q")
+    else:
+        print("\n✓ 所有依赖包已正确安装")
+
+    print("\n" + "=" * 80 + "\n")
+
+
+# pandas、matplotlib、google_play_scraper、google.generativeai 等重型依赖只在用到的阶段延迟导入，
+# 使导入本模块、--help 和不需要AI/图表的运行都能快速启动
+from datetime import datetime, timedelta
+from collections import Counter, deque
+import re
+import os
+import heapq
+import shutil
+import html
+import json
+import hashlib
+import random
+import functools
+import string
+import sqlite3
+import threading
+import time
+import queue
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 按最新优先分页拉取评论时每页的条数
+# （页越小，越早在跨过截止日期时停止；页越大，请求次数越少）
+REVIEW_PAGE_SIZE = 200
+
+# 默认抓取的评论地区 [(语言, 国家)]；配置多个时各地区并发抓取，按reviewId合并去重
+DEFAULT_LOCALES = [('en', 'us')]
+
+# 多地区抓取线程在队列已满时检查停止标记的间隔（秒）
+LOCALE_QUEUE_POLL_SECONDS = 0.5
+
+# 本地评论库的默认路径
+DEFAULT_STORE_PATH = 'reviews.db'
+
+# 网络调用（应用详情、评论分页、Gemini）失败后的默认重试次数，以及指数退避的基础/最大等待（秒）
+DEFAULT_MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# 熔断器：最近CIRCUIT_WINDOW次调用中失败比例达到CIRCUIT_ERROR_RATE时，暂停所有请求CIRCUIT_COOLDOWN秒
+CIRCUIT_WINDOW = 20
+CIRCUIT_ERROR_RATE = 0.5
+CIRCUIT_COOLDOWN = 30
+
+# 评论快照的默认目录（每个应用一个子目录）
+DEFAULT_SNAPSHOT_DIR = 'snapshots'
+
+# 批量分析时所有网络请求（应用详情、评论分页、Gemini）共享的默认限速（次/秒）
+DEFAULT_REQUESTS_PER_SECOND = 5
+
+# 批量流水线各阶段的默认并发数与阶段间队列长度
+DEFAULT_STAGE_WORKERS = {'fetch': 1, 'analyze': 1, 'llm': 1, 'render': 1}
+DEFAULT_PIPELINE_QUEUE_SIZE = 4
+
+# 常驻模式下应用的默认检查间隔（小时），以及调度循环单次休眠的上限（秒）
+DEFAULT_DAEMON_INTERVAL_HOURS = 24
+DAEMON_MAX_SLEEP_SECONDS = 60
+
+# 图表输出格式：格式名 -> (文件扩展名, 默认DPI)
+# png为原有的高清图片；preview为低DPI预览图；svg为矢量图；html为不依赖matplotlib的轻量网页图表
+CHART_FORMATS = {
+    'png': ('png', 300),
+    'preview': ('png', 72),
+    'svg': ('svg', None),
+    'html': ('html', None),
+}
+
+# 应用元数据缓存的默认路径和有效期（小时）
+DEFAULT_METADATA_CACHE_PATH = 'app_metadata_cache.json'
+DEFAULT_METADATA_TTL_HOURS = 6
+
+# 生成Newsletter使用的Gemini模型
+GEMINI_MODEL = 'models/gemini-2.5-flash'
+
+# Gemini结果缓存的默认目录与淘汰策略
+DEFAULT_GEMINI_CACHE_DIR = '.gemini_cache'
+DEFAULT_GEMINI_CACHE_MAX_ENTRIES = 2000
+DEFAULT_GEMINI_CACHE_MAX_AGE_DAYS = 30
+
+# 单个应用调用Gemini的默认时限（秒），包括重试；超时后改为生成不含AI分析的Newsletter
+DEFAULT_GEMINI_TIMEOUT = 60
+
+# Gemini prompt的默认token预算（估算值）；超出时按公平份额截断样本评论
+DEFAULT_PROMPT_TOKEN_BUDGET = 1500
+# 估算token数时，中日韩文字按每字一个token，其余文字按每CHARS_PER_TOKEN个字符一个token
+CHARS_PER_TOKEN = 4
+CJK_RANGES = ((0x3040, 0x30ff), (0x3400, 0x4dbf), (0x4e00, 0x9fff), (0xac00, 0xd7af), (0xf900, 0xfaff))
+CJK_PATTERN = re.compile('[' + ''.join(f'{chr(low)}-{chr(high)}' for low, high in CJK_RANGES) + ']')
+# 预算不足时每条样本评论至少保留的token数，保证仍有可引用的原文
+MIN_SAMPLE_TOKENS = 16
+# 写入研究数据的各情感样本评论条数
+SAMPLE_SIZES = {'正面': 5, '负面': 5, '中性': 3}
+
+# 近似重复评论判定：MinHash估计的Jaccard相似度下限、MinHash哈希函数个数、每块计算签名的评论条数
+DEDUPE_THRESHOLD = 0.8
+DEDUPE_NUM_PERM = 32
+DEDUPE_BLOCK_SIZE = 2048
+# 相似度恰好为阈值的评论对至少以该概率成为LSH候选（候选再用完整签名验证）
+DEDUPE_CANDIDATE_RECALL = 0.98
+# 计算词哈希时按字符位置区分的权重个数（更长的词其余字符共用最后一个权重）
+CHAR_WEIGHT_COUNT = 32
+# 切分shingle时视为词间分隔的字符（标点和空白，含常见全角标点）
+SHINGLE_SEPARATORS = str.maketrans(dict.fromkeys(
+    string.punctuation + string.whitespace + '，。！？、；：“”‘’（）《》【】…～·', ' '))
+
+# 关键词统计时排除的常见停用词
+STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+              'of', 'with', 'is', 'was', 'are', 'been', 'be', 'have', 'has', 'had',
+              'this', 'that', 'it', 'i', 'my', 'me', 'you', 'your', 'app', 'game',
+              'very', 'really', 'just', 'like', 'get', 'got', 'can', 'cant', 'dont',
+              'will', 'would', 'could', 'should', 'much', 'more', 'most', 'many',
+              'some', 'also', 'only', 'from', 'when', 'there', 'they', 'them',
+              'than', 'then', 'these', 'those', 'what', 'which', 'who', 'where',
+              'why', 'how', 'all', 'each', 'every', 'both', 'few', 'more', 'other',
+              'such', 'own', 'same', 'than', 'too', 'even', 'well', 'without',
+              'good', 'great', 'nice', 'best', 'love', 'bad', 'hate', 'worst'}
+
+# 各语言的关键词停用词表（英文沿用上面的STOP_WORDS）
+STOP_WORDS_BY_LANG = {
+    'en': STOP_WORDS,
+    'es': {'para', 'pero', 'como', 'este', 'esta', 'muy', 'todo', 'cuando', 'porque', 'juego',
+           'aplicacion', 'tiene', 'hace', 'desde', 'solo', 'bueno', 'buena', 'malo', 'mala', 'excelente'},
+    'pt': {'para', 'mas', 'como', 'este', 'esta', 'muito', 'tudo', 'quando', 'porque', 'jogo',
+           'aplicativo', 'tem', 'faz', 'desde', 'bom', 'boa', 'ruim', 'excelente', 'pra', 'isso'},
+    'de': {'aber', 'auch', 'dass', 'sehr', 'wenn', 'nicht', 'noch', 'immer', 'eine', 'einen',
+           'spiel', 'super', 'schon', 'kann', 'sind', 'wird', 'mehr', 'nach', 'oder', 'toll'},
+    'fr': {'pour', 'mais', 'comme', 'cette', 'tout', 'quand', 'parce', 'jeu', 'application',
+           'avec', 'dans', 'sont', 'fait', 'tres', 'bien', 'trop', 'plus', 'bon', 'bonne', 'nul'},
+}
+
+# 关键词分词的默认字母类：英文沿用原有的[a-z]，其他语言匹配任意Unicode字母
+TOKEN_LETTER_CLASSES = {'en': '[a-z]'}
+DEFAULT_TOKEN_LETTER_CLASS = r'[^\W\d_]'
+
+# 关键词统计每批处理的评论条数（决定单批分词结果的内存上限）
+KEYWORD_BATCH_SIZE = 10000
+
+# 流式分析时关键词频繁项摘要保留的计数器数量（远大于展示的前20个，保证头部词准确）
+KEYWORD_SKETCH_CAPACITY = 2000
+
+# 基于评分的情感标签：1-2分负面，3分中性，4-5分正面
+SENTIMENT_LABELS = ['负面', '中性', '正面']
+
+
+def fetch_app_details(app_id):
+    """
+    获取应用详情页信息
+    """
+    from google_play_scraper import app
+    return app(app_id)
+
+
+def fetch_review_page(app_id, lang='en', country='us', count=REVIEW_PAGE_SIZE, continuation_token=None):
+    """
+    按最新优先获取一页评论，返回 (评论列表, continuation_token)
+    """
+    from google_play_scraper import reviews, Sort
+    return reviews(
+        app_id,
+        lang=lang,
+        country=country,
+        sort=Sort.NEWEST,
+        count=count,
+        continuation_token=continuation_token
+    )
+
+
+_gemini_models = {}
+_gemini_models_lock = threading.Lock()
+
+
+def create_gemini_model(api_key):
+    """
+    配置Gemini并返回生成模型
+    同一API Key的模型对象在进程内复用，常驻模式下各轮分析共享同一个已配置的客户端
+    """
+    with _gemini_models_lock:
+        model = _gemini_models.get(api_key)
+        if model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(GEMINI_MODEL)
+            _gemini_models[api_key] = model
+        return model
+
+
+class GeminiTimeoutError(TimeoutError):
+    """
+    Gemini流式生成未在时限内完成
+    """
+
+
+def is_fatal_play_store_error(error):
+    """
+    不值得重试的Google Play错误：应用不存在（ID拼写错误或已下架）
+    """
+    try:
+        from google_play_scraper.exceptions import NotFoundError
+    except ImportError:
+        return False
+    return isinstance(error, NotFoundError)
+
+
+def is_fatal_gemini_error(error):
+    """
+    不值得重试的Gemini错误：已超过时限、4xx类请求错误（API Key无效、参数错误等，429限流除外），
+    以及回复被安全策略拦截时读取.text抛出的ValueError
+    """
+    if isinstance(error, (GeminiTimeoutError, ValueError)):
+        return True
+    try:
+        from google.api_core import exceptions as api_exceptions
+    except ImportError:
+        return False
+    return isinstance(error, api_exceptions.ClientError) and not isinstance(error, api_exceptions.TooManyRequests)
+
+
+class ProgressiveNewsletter:
+    """
+    边接收Gemini流式输出边写入Newsletter文件：先写入邮件主题和AI分析标题，之后逐块追加并刷新，
+    生成过程中即可查看已生成的部分；完整的Newsletter随后由write_newsletter覆盖写入
+
+    参数:
+        output_file: Newsletter文件路径
+        header: 写在AI分析之前的文本
+    """
+
+    def __init__(self, output_file, header):
+        self.output_file = output_file
+        self.header = header
+        self._file = open(output_file, 'w', encoding='utf-8')
+        self.restart()
+
+    def restart(self):
+        """
+        清空已写入的AI分析（重试时从头接收）
+        """
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(self.header)
+        self._file.flush()
+
+    def write(self, text):
+        self._file.write(text)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def estimate_tokens(text):
+    """
+    粗略估算文本的token数（不调用分词器）
+    """
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + -(-(len(text) - cjk) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    压缩空白并把文本截断到约max_tokens个token，截断处以省略号结尾
+    """
+    text = ' '.join(str(text).split())
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # 估算值随前缀长度单调增加，二分查找最长的可保留前缀（省略号占一个token）
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) + 1 <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+
+    return text[:low].rstrip() + '…'
+
+
+def allocate_token_budget(demands, budget):
+    """
+    按公平份额分配budget：需求不超过平均份额的项全额满足，余下的预算再平分给其余各项
+    返回与demands对应的分配列表
+    """
+    allocation = [0] * len(demands)
+    remaining = budget
+    order = sorted(range(len(demands)), key=lambda index: demands[index])
+
+    for position, index in enumerate(order):
+        share = remaining // (len(order) - position)
+        allocation[index] = min(demands[index], share)
+        remaining -= allocation[index]
+
+    return allocation
+
+
+# 情感饼图/条形图的配色
+SENTIMENT_COLORS = {'正面': 'lightgreen', '中性': 'yellow', '负面': 'lightcoral'}
+
+_matplotlib_configured = False
+
+
+def new_figure(**kwargs):
+    """
+    创建独立的matplotlib Figure（不经过pyplot全局状态），首次调用时设置中文字体
+    """
+    global _matplotlib_configured
+    import matplotlib
+    from matplotlib.figure import Figure
+
+    if not _matplotlib_configured:
+        # Set Chinese font for matplotlib
+        matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'STHeiti']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+        _matplotlib_configured = True
+
+    return Figure(**kwargs)
+
+
+# Newsletter中AI分析部分的标题
+AI_SECTION_TITLE = "## AI 分析报告\n\n"
+
+
+def newsletter_header(newsletter_data):
+    """
+    Newsletter开头的邮件主题
+    """
+    return (f"**邮件主题:** Google Play 舆情监控（{newsletter_data['mode_label']}）："
+            f"{newsletter_data['update_date']} - {newsletter_data['app_name']}\n"
+            "---\n\n")
+
+
+def render_newsletter(newsletter_data, output_file):
+    """
+    根据汇总数据组装Newsletter并写入文件，返回Newsletter文本
+    newsletter_data只含基础类型，可在子进程中调用
+    """
+    statistics = newsletter_data['statistics']
+    newsletter = [newsletter_header(newsletter_data)]
+
+    if newsletter_data['gemini_analysis']:
+        # 使用Gemini生成的分析
+        newsletter.append(AI_SECTION_TITLE)
+        newsletter.append(newsletter_data['gemini_analysis'])
+        newsletter.append("\n\n---\n\n")
+
+    # 添加数据摘要
+    newsletter.append("## 数据摘要\n\n")
+    newsletter.append(f"**分析模式:** {newsletter_data['analysis_mode']}\n")
+    if newsletter_data['analysis_period_days'] != 'N/A':
+        newsletter.append(f"**分析周期:** 更新后 {newsletter_data['analysis_period_days']} 天\n")
+    newsletter.append(f"**总评论数:** {statistics['total_reviews']}\n")
+    newsletter.append(f"**平均评分:** {statistics['average_rating']}/5.0\n")
+    newsletter.append(f"**情感分布:** 正面 {statistics['positive_percentage']}% | ")
+    newsletter.append(f"中性 {statistics['neutral_percentage']}% | ")
+    newsletter.append(f"负面 {statistics['negative_percentage']}%\n\n")
+    if statistics.get('duplicate_reviews'):
+        newsletter.append(f"**近似重复评论:** {statistics['duplicate_reviews']}条（{statistics['duplicate_groups']}组），"
+                          f"关键词和样本评论按组只计一次\n\n")
+
+    # 多个地区时按地区分列
+    locale_breakdown = newsletter_data.get('locale_breakdown') or {}
+    if len(locale_breakdown) > 1:
+        newsletter.append("**地区分布:**\n\n")
+        newsletter.append("| 地区 | 评论数 | 平均评分 | 负面占比 |\n")
+        newsletter.append("|------|--------|----------|----------|\n")
+        for locale, stats in locale_breakdown.items():
+            newsletter.append(f"| {locale} | {stats['reviews']} | {stats['average_rating']} | "
+                              f"{stats['negative_percentage']}% |\n")
+        newsletter.append("\n")
+
+    # 高频关键词
+    newsletter.append("**高频关键词:**\n")
+    for keyword, count in list(newsletter_data['top_keywords'].items())[:10]:
+        newsletter.append(f"- {keyword}: {count}次\n")
+
+    newsletter.append("\n---\n\n")
+    newsletter.append("如有问题或建议请随时联系。\n")
+
+    # 写入文件
+    newsletter_text = "".join(newsletter)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(newsletter_text)
+
+    return newsletter_text
+
+
+def render_outputs(newsletter_data, newsletter_file, chart_task):
+    """
+    渲染阶段的全部CPU密集工作（Newsletter + 图表），供渲染进程池调用
+    chart_task为None或标记为skip时不渲染图表
+    """
+    render_newsletter(newsletter_data, newsletter_file)
+
+    if chart_task and not chart_task['skip']:
+        render_charts(chart_task['chart_data'], chart_task['output_file'],
+                      chart_task['chart_format'], chart_task['dpi'])
+
+
+def chart_data_hash(chart_data, chart_format, dpi):
+    """
+    图表输入的内容哈希（聚合数据 + 输出格式），用于判断是否需要重新渲染
+    """
+    payload = json.dumps([chart_data, chart_format, dpi], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def render_charts(chart_data, output_file, chart_format='png', dpi=None):
+    """
+    根据聚合数据渲染四宫格图表（评分分布、每日评论量、每日平均评分、情感分布）
+    """
+    if chart_format == 'html':
+        render_html_chart(chart_data, output_file)
+        return output_file
+
+    # 使用面向对象的Figure而非pyplot全局状态，多个应用可在不同线程中同时绘图
+    fig = new_figure(figsize=(15, 10))
+    axes = fig.subplots(2, 2)
+    fig.suptitle(f'评论分析: {chart_data["title"]}', fontsize=16, fontweight='bold')
+
+    # 1. 评分分布
+    rating_counts = chart_data['rating_counts']
+    axes[0, 0].bar(list(rating_counts), list(rating_counts.values()), color='skyblue', edgecolor='navy')
+    axes[0, 0].set_title('评分分布', fontsize=12, fontweight='bold')
+    axes[0, 0].set_xlabel('评分')
+    axes[0, 0].set_ylabel('数量')
+    axes[0, 0].set_xticks([1, 2, 3, 4, 5])
+    axes[0, 0].grid(axis='y', alpha=0.3)
+
+    # 2. 每日评论量趋势
+    dates = [datetime.strptime(day, '%Y-%m-%d').date() for day in chart_data['dates']]
+    axes[0, 1].plot(dates, chart_data['daily_counts'], marker='o', color='green', linewidth=2)
+    axes[0, 1].fill_between(dates, chart_data['daily_counts'], alpha=0.3, color='green')
+    axes[0, 1].set_title('每日评论量', fontsize=12, fontweight='bold')
+    axes[0, 1].set_xlabel('日期')
+    axes[0, 1].set_ylabel('评论数')
+    axes[0, 1].tick_params(axis='x', rotation=45)
+    axes[0, 1].grid(alpha=0.3)
+
+    # 3. 每日平均评分趋势
+    axes[1, 0].plot(dates, chart_data['daily_avg'], marker='o', color='orange', linewidth=2)
+    axes[1, 0].set_title('每日平均评分', fontsize=12, fontweight='bold')
+    axes[1, 0].set_xlabel('日期')
+    axes[1, 0].set_ylabel('平均评分')
+    axes[1, 0].set_ylim([0, 5])
+    axes[1, 0].axhline(y=3.5, color='r', linestyle='--', label='3.5阈值', linewidth=2)
+    axes[1, 0].legend()
+    axes[1, 0].tick_params(axis='x', rotation=45)
+    axes[1, 0].grid(alpha=0.3)
+
+    # 4. 情感饼图
+    sentiment_counts = chart_data['sentiment_counts']
+    axes[1, 1].pie(list(sentiment_counts.values()), labels=list(sentiment_counts), autopct='%1.1f%%',
+                   colors=[SENTIMENT_COLORS.get(x, 'gray') for x in sentiment_counts],
+                   startangle=90, textprops={'fontsize': 11})
+    axes[1, 1].set_title('情感分布', fontsize=12, fontweight='bold')
+
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=dpi, bbox_inches='tight')
+
+    return output_file
+
+
+def render_html_chart(chart_data, output_file):
+    """
+    不依赖matplotlib的轻量图表：用内联SVG生成单个HTML文件
+    """
+    width, height, pad = 420, 220, 30
+
+    def bar_svg(labels, values, colors):
+        top = max(values) if values and max(values) > 0 else 1
+        slot = (width - 2 * pad) / max(len(values), 1)
+        parts = []
+        for i, (label, value) in enumerate(zip(labels, values)):
+            bar_height = (height - 2 * pad) * value / top
+            x = pad + i * slot + slot * 0.15
+            y = height - pad - bar_height
+            parts.append(
+                f'<rect x="{x:.1f}" y="{y:.1f}" width="{slot * 0.7:.1f}" height="{bar_height:.1f}" '
+                f'fill="{colors[i]}"><title>{html.escape(str(label))}: {value}</title></rect>'
+                f'<text x="{x + slot * 0.35:.1f}" y="{height - pad + 15}" text-anchor="middle" '
+                f'font-size="11">{html.escape(str(label))}</text>'
+                f'<text x="{x + slot * 0.35:.1f}" y="{y - 4:.1f}" text-anchor="middle" font-size="10">{value}</text>'
+            )
+        return ''.join(parts)
+
+    def line_svg(values, color, max_value=None):
+        if not values:
+            return ''
+        top = max_value or max(values) or 1
+        step = (width - 2 * pad) / max(len(values) - 1, 1)
+        points = ' '.join(
+            f"{pad + i * step:.1f},{height - pad - (height - 2 * pad) * value / top:.1f}"
+            for i, value in enumerate(values)
+        )
+        return f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="2"/>'
+
+    def panel(title, content, footer=''):
+        return (f'<div class="panel"><h3>{title}</h3>'
+                f'<svg width="{width}" height="{height}">'
+                f'<line x1="{pad}" y1="{height - pad}" x2="{width - pad}" y2="{height - pad}" stroke="#999"/>'
+                f'{content}</svg><p>{footer}</p></div>')
+
+    ratings = chart_data['rating_counts']
+    sentiments = chart_data['sentiment_counts']
+    dates = chart_data['dates']
+    date_range = f"{dates[0]} ~ {dates[-1]}" if dates else ''
+
+    panels = [
+        panel('评分分布', bar_svg([f'{k}分' for k in ratings], list(ratings.values()),
+                                  ['skyblue'] * len(ratings))),
+        panel('每日评论量', line_svg(chart_data['daily_counts'], 'green'), date_range),
+        panel('每日平均评分', line_svg(chart_data['daily_avg'], 'orange', max_value=5), date_range),
+        panel('情感分布', bar_svg(list(sentiments), list(sentiments.values()),
+                                  [SENTIMENT_COLORS.get(k, 'gray') for k in sentiments])),
+    ]
+
+    document = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>评论分析: {html.escape(chart_data["title"])}</title>'
+        '<style>body{font-family:sans-serif}.grid{display:grid;grid-template-columns:repeat(2,460px)}'
+        '.panel{margin:8px}h3{margin:4px 0}p{margin:0;color:#666;font-size:12px}</style></head><body>'
+        f'<h2>评论分析: {html.escape(chart_data["title"])}</h2>'
+        f'<div class="grid">{"".join(panels)}</div></body></html>'
+    )
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(document)
+
+
+class RateLimiter:
+    """
+    令牌桶限速器（线程安全）
+    多个应用并发分析时共享同一个实例，保证全局请求速率不超过上限；
+    请求失败时速率减半，之后每次成功逐步恢复，直到配置的上限（加性增、乘性减）
+    """
+
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, burst=None, min_rate=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.capacity = burst if burst is not None else max(1, int(rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        取得一个令牌，令牌不足时阻塞等待
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def slow_down(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RetryPolicy:
+    """
+    指数退避重试策略（full jitter：第n次重试前随机等待0到min(最大等待, 基础等待*2^n)秒）
+
+    参数:
+        max_retries: 首次调用失败后的最多重试次数
+        base_delay: 基础等待（秒）
+        max_delay: 单次等待的上限（秒）
+    """
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    错误率熔断器（线程安全）
+    最近window次调用中的失败比例达到error_rate时断开，cooldown秒内所有请求在wait()处暂停，
+    避免在被限流时继续以原速率请求；冷却结束后重新统计
+
+    参数:
+        window: 统计的最近调用次数
+        error_rate: 触发熔断的失败比例
+        cooldown: 熔断后暂停的秒数
+    """
+
+    def __init__(self, window=CIRCUIT_WINDOW, error_rate=CIRCUIT_ERROR_RATE, cooldown=CIRCUIT_COOLDOWN):
+        self.window = window
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.trips = 0
+        self._outcomes = deque(maxlen=window)
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        熔断期间阻塞到冷却结束
+        """
+        while True:
+            with self._lock:
+                remaining = self._open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def record(self, success):
+        with self._lock:
+            self._outcomes.append(success)
+            if len(self._outcomes) < self.window:
+                return
+
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.error_rate:
+                self._open_until = time.monotonic() + self.cooldown
+                self._outcomes.clear()
+                self.trips += 1
+                print(f"⚠️  最近{self.window}次请求中{failures}次失败，暂停所有请求{self.cooldown}秒")
+
+
+class MetadataCache:
+    """
+    应用元数据缓存（JSON文件）
+    只保存分析用到的字段（title、version、updated），在有效期内直接复用，
+    避免每次运行都请求应用详情页
+    """
+
+    FIELDS = ('title', 'version', 'updated')
+
+    def __init__(self, path=DEFAULT_METADATA_CACHE_PATH, ttl_hours=DEFAULT_METADATA_TTL_HOURS,
+                 force_refresh=False):
+        self.path = path
+        self.ttl = timedelta(hours=ttl_hours)
+        self.force_refresh = force_refresh
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"警告：无法读取元数据缓存 {path}: {e}")
+
+    def get(self, app_id):
+        """
+        返回未过期的缓存应用信息，没有或已过期时返回None
+        """
+        if self.force_refresh:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(app_id)
+
+        if not entry:
+            return None
+
+        fetched_at = datetime.fromisoformat(entry['fetched_at'])
+        if datetime.now() - fetched_at > self.ttl:
+            return None
+
+        return dict(entry['app_info'])
+
+    def put(self, app_id, app_info):
+        with self._lock:
+            self._entries[app_id] = {
+                'fetched_at': datetime.now().isoformat(),
+                'app_info': {key: app_info.get(key) for key in self.FIELDS}
+            }
+            self._save()
+
+    def _save(self):
+        # 先写临时文件再替换，避免中断时留下损坏的缓存
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+
+
+class GeminiCache:
+    """
+    Gemini生成结果的内容寻址缓存
+    以 模型名 + prompt 的SHA-256为键，每条结果保存为缓存目录下的一个JSON文件；
+    超过max_age_days的条目失效，条目数超过max_entries时淘汰最旧的
+    """
+
+    def __init__(self, cache_dir=DEFAULT_GEMINI_CACHE_DIR, max_entries=DEFAULT_GEMINI_CACHE_MAX_ENTRIES,
+                 max_age_days=DEFAULT_GEMINI_CACHE_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_age = timedelta(days=max_age_days)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model_name, prompt):
+        return hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, model_name, prompt):
+        """
+        返回缓存的生成结果，未命中或已过期时返回None
+        """
+        path = self._entry_path(self.make_key(model_name, prompt))
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if datetime.now() - datetime.fromisoformat(entry['created_at']) > self.max_age:
+                entry = None
+        except (OSError, ValueError, KeyError):
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return entry['text']
+
+    def put(self, model_name, prompt, text):
+        path = self._entry_path(self.make_key(model_name, prompt))
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'model': model_name,
+                'created_at': datetime.now().isoformat(),
+                'text': text
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        删除过期条目，并在条目数超限时按修改时间淘汰最旧的条目
+        """
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+
+            entries.sort()
+            expire_before = (datetime.now() - self.max_age).timestamp()
+            excess = len(entries) - self.max_entries
+
+            for i, (mtime, path) in enumerate(entries):
+                if i < excess or mtime < expire_before:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def stats_line(self):
+        return f"Gemini缓存: 命中{self.hits}次，未命中{self.misses}次"
+
+
+# 评论时间统一用“本地时钟秒数”表示：把无时区的datetime当作UTC换算成整数秒，
+# 换算回来得到相同的年月日时分秒，按天分组时 at // 86400 即为日期序号
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_seconds(dt):
+    return int((dt - EPOCH).total_seconds())
+
+
+def from_epoch_seconds(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def locale_key(lang, country):
+    """
+    评论地区的标识，如 'pt-br'
+    """
+    return f"{lang}-{country}"
+
+
+def parse_locales(value):
+    """
+    解析 'en-us,pt-br' 形式的地区列表，返回 [(语言, 国家), ...]
+    """
+    locales = []
+    for item in value.split(','):
+        item = item.strip().lower().replace('_', '-')
+        if not item:
+            continue
+        lang, sep, country = item.partition('-')
+        if not sep or not lang or not country:
+            raise ValueError(f"地区格式应为 语言-国家（如 en-us），实际为: {item}")
+        locales.append((lang, country))
+
+    if not locales:
+        raise ValueError("地区列表为空")
+
+    return list(dict.fromkeys(locales))
+
+
+def locale_breakdown(locale_stats):
+    """
+    把各地区统计（count、mean、negative列）转换为基础类型字典，按评论数从多到少排列
+    """
+    return {
+        str(locale): {
+            'reviews': int(row['count']),
+            'average_rating': round(float(row['mean']), 2),
+            'negative_percentage': round(float(row['negative']) * 100, 1),
+        }
+        for locale, row in locale_stats.sort_values('count', ascending=False, kind='stable').iterrows()
+    }
+
+
+class Review:
+    """
+    精简的评论记录，只保留分析用到的五个字段
+    抓取到的评论在进入系统时即被投影成Review，原始字典（用户名、头像、回复、版本号等）随页丢弃
+
+    参数:
+        review_id: 评论ID
+        content: 评论内容
+        score: 评分（1-5）
+        thumbs_up: 点赞数
+        at: 评论时间（本地时钟秒数，见to_epoch_seconds）
+        locale: 评论来源地区（见locale_key）
+    """
+
+    __slots__ = ('review_id', 'content', 'score', 'thumbs_up', 'at', 'locale')
+
+    def __init__(self, review_id, content, score, thumbs_up, at, locale):
+        self.review_id = review_id
+        self.content = content
+        self.score = score
+        self.thumbs_up = thumbs_up
+        self.at = at
+        self.locale = locale
+
+    @classmethod
+    def from_scraper(cls, raw, locale):
+        """
+        从google_play_scraper返回的评论字典投影
+        """
+        return cls(raw['reviewId'], raw['content'], int(raw['score']),
+                   int(raw['thumbsUpCount'] or 0), to_epoch_seconds(raw['at']), locale)
+
+    @property
+    def at_datetime(self):
+        return from_epoch_seconds(self.at)
+
+    def __repr__(self):
+        return f"Review({self.review_id!r}, score={self.score}, at={self.at_datetime}, locale={self.locale!r})"
+
+
+class ReviewStore:
+    """
+    本地评论库（SQLite）
+    评论在每个 (app_id, lang, country) 内按reviewId去重保存（同一条评论出现在多个地区时各存一份），
+    并为每个地区记录已同步的时间范围：高水位为库中最新评论的时间，低水位为连续同步覆盖到的最早时间
+
+    同时维护按天汇总表（评论数、评分和、各星级数、点赞和、关键词计数），
+    合并评论时只为新增或变化的评论更新对应的天；汇总表缺失或关键词统计方式变化时从评论表重建
+
+    参数:
+        db_path: 数据库文件路径
+        keyword_extractor: 按天关键词计数使用的KeywordExtractor，应与分析时的一致
+    """
+
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    # 按天汇总表中的累加列
+    ROLLUP_COLUMNS = ('count', 'score_sum', 'star1', 'star2', 'star3', 'star4', 'star5', 'thumbs_up_sum')
+
+    def __init__(self, db_path=DEFAULT_STORE_PATH, keyword_extractor=None):
+        self.db_path = db_path
+        self.keyword_extractor = keyword_extractor or KeywordExtractor()
+        self._lock = threading.Lock()
+        # 本进程中已确认汇总表可用的 (app_id, lang, country)
+        self._rollups_ready = set()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reviews (
+                review_id TEXT NOT NULL,
+                app_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                country TEXT NOT NULL,
+                at TEXT NOT NULL,
+                score INTEGER,
+                thumbs_up INTEGER,
+                content TEXT,
+                PRIMARY KEY (review_id, app_id, lang, country)
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                app_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                country TEXT NOT NULL,
+                high_water TEXT NOT NULL,
+                low_water TEXT NOT NULL,
+                synced_at TEXT NOT NULL,
+                PRIMARY KEY (app_id, lang, country)
+            );
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                app_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                country TEXT NOT NULL,
+                day TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                score_sum INTEGER NOT NULL,
+                star1 INTEGER NOT NULL,
+                star2 INTEGER NOT NULL,
+                star3 INTEGER NOT NULL,
+                star4 INTEGER NOT NULL,
+                star5 INTEGER NOT NULL,
+                thumbs_up_sum INTEGER NOT NULL,
+                PRIMARY KEY (app_id, lang, country, day)
+            );
+            CREATE TABLE IF NOT EXISTS daily_keywords (
+                app_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                country TEXT NOT NULL,
+                day TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (app_id, lang, country, day, keyword)
+            );
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                app_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                country TEXT NOT NULL,
+                keyword_signature TEXT NOT NULL,
+                PRIMARY KEY (app_id, lang, country)
+            );
+        """)
+        self._migrate_review_key()
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_app_at ON reviews (app_id, lang, country, at)")
+        self._conn.commit()
+
+    def _migrate_review_key(self):
+        """
+        旧版库的评论表只以review_id为主键，同一条评论只保存在最先同步的地区；
+        改为 (review_id, app_id, lang, country) 主键后，清除同一应用有多个地区的同步状态，
+        让这些地区下次运行时重新完整同步一次，补回缺失的评论
+        """
+        primary_key = [row[1] for row in sorted(self._conn.execute("PRAGMA table_info(reviews)"),
+                                                key=lambda row: row[5]) if row[5]]
+        if primary_key != ['review_id']:
+            return
+
+        print("正在升级本地评论库：评论改为按地区分别保存...")
+        self._conn.executescript("""
+            ALTER TABLE reviews RENAME TO reviews_old;
+            DROP INDEX IF EXISTS idx_reviews_app_at;
+            CREATE TABLE reviews (
+                review_id TEXT NOT NULL,
+                app_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                country TEXT NOT NULL,
+                at TEXT NOT NULL,
+                score INTEGER,
+                thumbs_up INTEGER,
+                content TEXT,
+                PRIMARY KEY (review_id, app_id, lang, country)
+            );
+            INSERT INTO reviews SELECT review_id, app_id, lang, country, at, score, thumbs_up, content
+                FROM reviews_old;
+            DROP TABLE reviews_old;
+            DELETE FROM sync_state WHERE app_id IN (
+                SELECT app_id FROM sync_state GROUP BY app_id HAVING COUNT(*) > 1
+            );
+        """)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_sync_state(self, app_id, lang, country):
+        """
+        返回 (高水位, 低水位)，从未同步过时返回 (None, None)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT high_water, low_water FROM sync_state WHERE app_id = ? AND lang = ? AND country = ?",
+                (app_id, lang, country)
+            ).fetchone()
+
+        if not row:
+            return None, None
+
+        return (datetime.strptime(row[0], self.DATE_FORMAT),
+                datetime.strptime(row[1], self.DATE_FORMAT))
+
+    def set_sync_state(self, app_id, lang, country, high_water, low_water):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?, ?)",
+                (app_id, lang, country,
+                 high_water.strftime(self.DATE_FORMAT),
+                 low_water.strftime(self.DATE_FORMAT),
+                 datetime.now().strftime(self.DATE_FORMAT))
+            )
+            self._conn.commit()
+
+    def add_reviews(self, app_id, lang, country, reviews_page):
+        """
+        合并一个地区的一页评论；该地区已存在的reviewId只更新会变化的字段（内容、评分、点赞数）
+        按天汇总表同步更新：新评论计入所在的天，内容或评分变化的评论先减去旧值再计入新值
+        """
+        # 同一页中重复的reviewId以最后一条为准
+        page = list({review.review_id: review for review in reviews_page}.values())
+        rows = [
+            (review.review_id, app_id, lang, country,
+             review.at_datetime.strftime(self.DATE_FORMAT),
+             review.score, review.thumbs_up, review.content)
+            for review in page
+        ]
+
+        with self._lock:
+            existing = self._existing_reviews(app_id, lang, country, [review.review_id for review in page])
+
+            # 先确保该地区的汇总表已建好（重建基于写入前的评论表），再写入评论和增量
+            self._ensure_rollups(app_id, lang, country)
+
+            self._conn.executemany(
+                """INSERT INTO reviews VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(review_id, app_id, lang, country) DO UPDATE SET
+                       score = excluded.score,
+                       thumbs_up = excluded.thumbs_up,
+                       content = excluded.content""",
+                rows
+            )
+
+            deltas = {}
+            for review_id, _, _, _, at, score, thumbs_up, content in rows:
+                old = existing.get(review_id)
+                if old is None:
+                    self._add_rollup_delta(deltas, (lang, country, at[:10]), score, thumbs_up, content, 1)
+                elif old[1:] != (score, thumbs_up, content):
+                    # 已有评论保留原来的时间
+                    key = (lang, country, old[0][:10])
+                    self._add_rollup_delta(deltas, key, old[1], old[2], old[3], -1)
+                    self._add_rollup_delta(deltas, key, score, thumbs_up, content, 1)
+
+            self._apply_rollup_deltas(app_id, deltas)
+            self._conn.commit()
+
+    def _existing_reviews(self, app_id, lang, country, review_ids):
+        """
+        reviewId -> (at, score, thumbs_up, content)，只包含该地区库中已有的评论
+        """
+        existing = {}
+        # 分批查询，避免超过SQLite的参数个数上限
+        for start in range(0, len(review_ids), 500):
+            batch = review_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(batch))
+            for row in self._conn.execute(
+                    "SELECT review_id, at, score, thumbs_up, content FROM reviews "
+                    f"WHERE app_id = ? AND lang = ? AND country = ? AND review_id IN ({placeholders})",
+                    [app_id, lang, country, *batch]):
+                existing[row[0]] = row[1:]
+
+        return existing
+
+    @staticmethod
+    def _add_rollup_delta(deltas, key, score, thumbs_up, content, sign):
+        """
+        把一条评论的贡献（sign为1计入、-1扣除）累加到deltas[key] = [各汇总列, 计入的内容, 扣除的内容]
+        """
+        delta = deltas.setdefault(key, [[0] * len(ReviewStore.ROLLUP_COLUMNS), [], []])
+        values = delta[0]
+        values[0] += sign
+        values[1] += sign * (score or 0)
+        if score in (1, 2, 3, 4, 5):
+            values[1 + score] += sign
+        values[7] += sign * (thumbs_up or 0)
+        delta[1 if sign > 0 else 2].append(content)
+
+    def _apply_rollup_deltas(self, app_id, deltas):
+        """
+        把按天的增量写入汇总表（调用方持有锁）
+        """
+        if not deltas:
+            return
+
+        assignments = ', '.join(f'{column} = {column} + excluded.{column}' for column in self.ROLLUP_COLUMNS)
+        self._conn.executemany(
+            f"""INSERT INTO daily_rollups VALUES (?, ?, ?, ?, {', '.join('?' * len(self.ROLLUP_COLUMNS))})
+                ON CONFLICT(app_id, lang, country, day) DO UPDATE SET {assignments}""",
+            [(app_id, *key, *delta[0]) for key, delta in deltas.items()]
+        )
+
+        keyword_rows = []
+        for key, (_, added, removed) in deltas.items():
+            counts = self.keyword_extractor.count(added)
+            if removed:
+                counts.subtract(self.keyword_extractor.count(removed))
+            keyword_rows.extend((app_id, *key, keyword, count) for keyword, count in counts.items() if count)
+
+        self._conn.executemany(
+            """INSERT INTO daily_keywords VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(app_id, lang, country, day, keyword) DO UPDATE SET count = count + excluded.count""",
+            keyword_rows
+        )
+        if any(delta[2] for delta in deltas.values()):
+            self._conn.execute("DELETE FROM daily_keywords WHERE app_id = ? AND count <= 0", (app_id,))
+
+    def _ensure_rollups(self, app_id, lang, country):
+        """
+        汇总表从未建立或关键词统计方式已变化时，从评论表重建该地区的汇总（调用方持有锁）
+        """
+        locale = (app_id, lang, country)
+        if locale in self._rollups_ready:
+            return
+
+        signature = self.keyword_extractor.signature
+        row = self._conn.execute(
+            "SELECT keyword_signature FROM rollup_state WHERE app_id = ? AND lang = ? AND country = ?", locale
+        ).fetchone()
+
+        if row is None or row[0] != signature:
+            self._conn.execute("DELETE FROM daily_rollups WHERE app_id = ? AND lang = ? AND country = ?", locale)
+            self._conn.execute("DELETE FROM daily_keywords WHERE app_id = ? AND lang = ? AND country = ?", locale)
+
+            # 按时间顺序读取，同一天的评论连续出现，每次只为一天累计
+            cursor = self._conn.execute(
+                "SELECT at, score, thumbs_up, content FROM reviews "
+                "WHERE app_id = ? AND lang = ? AND country = ? ORDER BY at", locale)
+            deltas = {}
+            for at, score, thumbs_up, content in cursor:
+                key = (lang, country, at[:10])
+                if key not in deltas and deltas:
+                    self._apply_rollup_deltas(app_id, deltas)
+                    deltas = {}
+                self._add_rollup_delta(deltas, key, score, thumbs_up, content, 1)
+            self._apply_rollup_deltas(app_id, deltas)
+
+            self._conn.execute("INSERT OR REPLACE INTO rollup_state VALUES (?, ?, ?, ?)", (*locale, signature))
+            self._conn.commit()
+
+        self._rollups_ready.add(locale)
+
+    def ensure_rollups(self, app_id, lang, country):
+        with self._lock:
+            self._ensure_rollups(app_id, lang, country)
+
+    @staticmethod
+    def _locales_clause(locales):
+        """
+        [(语言, 国家), ...] 对应的WHERE条件和参数
+        """
+        clause = ' OR '.join('(lang = ? AND country = ?)' for _ in locales)
+        return f'({clause})', [value for locale in locales for value in locale]
+
+    def window_start(self, app_id, locales, since=None, limit=None):
+        """
+        分析窗口的起点 (at, review_id)：窗口包含 (at, review_id) 不早于起点的评论
+        提供since时起点为 (since, '')；否则为所有地区合并（按reviewId去重）后第limit新的评论
+        （不足limit条时为最早的一条），库中没有评论时返回None
+        """
+        if since is not None:
+            return since.strftime(self.DATE_FORMAT), ''
+
+        clause, params = self._locales_clause(locales)
+        with self._lock:
+            return self._conn.execute(
+                f"""SELECT at, review_id FROM (
+                        SELECT DISTINCT at, review_id FROM reviews WHERE app_id = ? AND {clause}
+                        ORDER BY at DESC, review_id DESC LIMIT ?
+                    ) ORDER BY at, review_id LIMIT 1""",
+                [app_id, *params, limit]
+            ).fetchone()
+
+    def rollup_rows(self, app_id, locales, after_day):
+        """
+        读取after_day（'YYYY-MM-DD'）之后各天的汇总行：
+        (lang, country, day, count, score_sum, star1..star5, thumbs_up_sum)
+        """
+        clause, params = self._locales_clause(locales)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT lang, country, day, {', '.join(self.ROLLUP_COLUMNS)} FROM daily_rollups "
+                f"WHERE app_id = ? AND {clause} AND day > ?",
+                [app_id, *params, after_day]
+            ).fetchall()
+
+    def rollup_keywords(self, app_id, locales, after_day):
+        """
+        after_day之后各天关键词计数之和，返回Counter
+        """
+        clause, params = self._locales_clause(locales)
+        with self._lock:
+            return Counter(dict(self._conn.execute(
+                f"SELECT keyword, SUM(count) FROM daily_keywords "
+                f"WHERE app_id = ? AND {clause} AND day > ? GROUP BY keyword",
+                [app_id, *params, after_day]
+            )))
+
+    def window_day_reviews(self, app_id, locales, window):
+        """
+        窗口起点所在的一天中属于窗口的评论：(lang, country, at, score, thumbs_up, content)
+        """
+        clause, params = self._locales_clause(locales)
+        next_day = (datetime.strptime(window[0][:10], '%Y-%m-%d') + timedelta(days=1)).strftime(self.DATE_FORMAT)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT lang, country, at, score, thumbs_up, content FROM reviews "
+                f"WHERE app_id = ? AND {clause} AND (at, review_id) >= (?, ?) AND at < ?",
+                [app_id, *params, *window, next_day]
+            ).fetchall()
+
+    def duplicate_window_reviews(self, app_id, locales, window):
+        """
+        窗口内同一条评论在多个地区中的多余副本：(lang, country, at, score, thumbs_up, content)
+        评论归属于locales中最先出现的地区，靠后地区的副本需要从按地区分别统计的汇总中扣除
+        """
+        duplicates = []
+        with self._lock:
+            for position, (lang, country) in enumerate(locales[1:], 1):
+                clause, params = self._locales_clause(locales[:position])
+                duplicates.extend(self._conn.execute(
+                    f"""SELECT lang, country, at, score, thumbs_up, content FROM reviews AS r
+                        WHERE app_id = ? AND lang = ? AND country = ? AND (at, review_id) >= (?, ?)
+                          AND EXISTS (SELECT 1 FROM reviews WHERE review_id = r.review_id AND app_id = r.app_id
+                                      AND {clause})""",
+                    [app_id, lang, country, *window, *params]
+                ))
+
+        return duplicates
+
+    def top_window_reviews(self, app_id, locales, window, n):
+        """
+        窗口内每种情感（SENTIMENT_LABELS的下标：1-2分为0，3分为1，4-5分为2）点赞最多的n条评论，
+        一次扫描窗口完成（多个地区中的同一条评论只取一次）：(情感下标, content, score, thumbs_up)，
+        同一情感内按点赞数从高到低
+        """
+        clause, params = self._locales_clause(locales)
+        with self._lock:
+            return self._conn.execute(
+                f"""SELECT sentiment, content, score, thumbs_up FROM (
+                        SELECT content, score, thumbs_up,
+                               CASE WHEN score <= 2 THEN 0 WHEN score = 3 THEN 1 ELSE 2 END AS sentiment,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY CASE WHEN score <= 2 THEN 0 WHEN score = 3 THEN 1 ELSE 2 END
+                                   ORDER BY thumbs_up DESC, at DESC, review_id DESC
+                               ) AS position
+                        FROM (
+                            SELECT review_id, at, content, score, MAX(thumbs_up) AS thumbs_up FROM reviews
+                            WHERE app_id = ? AND {clause} AND (at, review_id) >= (?, ?) GROUP BY review_id
+                        )
+                    ) WHERE position <= ? ORDER BY sentiment, position""",
+                [app_id, *params, *window, n]
+            ).fetchall()
+
+    def count_reviews(self, app_id, lang, country, since=None):
+        query = "SELECT COUNT(*) FROM reviews WHERE app_id = ? AND lang = ? AND country = ?"
+        params = [app_id, lang, country]
+        if since is not None:
+            query += " AND at >= ?"
+            params.append(since.strftime(self.DATE_FORMAT))
+
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def count_distinct_reviews(self, app_id, locales, since=None):
+        """
+        多个地区合并后的评论条数，同一条评论只计一次
+        """
+        clause, params = self._locales_clause(locales)
+        query = f"SELECT COUNT(DISTINCT review_id) FROM reviews WHERE app_id = ? AND {clause}"
+        params = [app_id, *params]
+        if since is not None:
+            query += " AND at >= ?"
+            params.append(since.strftime(self.DATE_FORMAT))
+
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def iter_review_pages(self, app_id, lang, country, since=None, limit=None, page_size=REVIEW_PAGE_SIZE):
+        """
+        按最新优先分页读取评论（键集分页，每次只持有一页），每页为Review列表
+        """
+        remaining = limit
+        cursor = None
+
+        while remaining is None or remaining > 0:
+            query = ("SELECT review_id, at, score, thumbs_up, content FROM reviews "
+                     "WHERE app_id = ? AND lang = ? AND country = ?")
+            params = [app_id, lang, country]
+            if since is not None:
+                query += " AND at >= ?"
+                params.append(since.strftime(self.DATE_FORMAT))
+            if cursor is not None:
+                query += " AND (at, review_id) < (?, ?)"
+                params.extend(cursor)
+            query += " ORDER BY at DESC, review_id DESC LIMIT ?"
+            params.append(page_size if remaining is None else min(page_size, remaining))
+
+            with self._lock:
+                rows = self._conn.execute(query, params).fetchall()
+
+            if not rows:
+                break
+
+            cursor = (rows[-1][1], rows[-1][0])
+            if remaining is not None:
+                remaining -= len(rows)
+
+            locale = locale_key(lang, country)
+            yield [
+                Review(review_id, content, score, thumbs_up or 0,
+                       to_epoch_seconds(datetime.strptime(at, self.DATE_FORMAT)), locale)
+                for review_id, at, score, thumbs_up, content in rows
+            ]
+
+    def load_reviews(self, app_id, lang, country, since=None, limit=None):
+        """
+        按最新优先读取全部符合条件的评论
+        """
+        loaded = []
+        for page in self.iter_review_pages(app_id, lang, country, since=since, limit=limit):
+            loaded.extend(page)
+        return loaded
+
+
+class KeywordExtractor:
+    """
+    分批统计评论关键词
+    默认分词方式下，每批评论拼接成一个字符串只跑一次正则，由Counter在C层完成计数，
+    停用词在计数后从（数量小得多的）不同词中剔除；内存只与批大小和词汇量相关，
+    不会构建全部评论的词列表
+    """
+
+    def __init__(self, lang='en', ngram=1, stop_words=None, tokenizer=None, min_length=4,
+                 batch_size=KEYWORD_BATCH_SIZE):
+        """
+        参数:
+            lang: 语言代码，决定默认停用词表和分词字母类
+            ngram: 统计的词组长度，1为单词，2为双词组，以此类推
+            stop_words: 自定义停用词集合，默认按lang从STOP_WORDS_BY_LANG选取
+            tokenizer: 可选的分词函数 text -> [token, ...]，默认使用正则分词
+            min_length: 单词的最小长度（更短的词不计入）
+        """
+        self.lang = lang
+        self.ngram = ngram
+        self.stop_words = stop_words if stop_words is not None else STOP_WORDS_BY_LANG.get(lang, set())
+        self.tokenizer = tokenizer
+        self.min_length = min_length
+        self.batch_size = batch_size
+
+        letter_class = TOKEN_LETTER_CLASSES.get(lang, DEFAULT_TOKEN_LETTER_CLASS)
+        self._pattern = re.compile(rf'\b{letter_class}{{{min_length},}}\b')
+
+    def _tokenize(self, text):
+        if self.tokenizer is not None:
+            return [w for w in self.tokenizer(text.lower()) if len(w) >= self.min_length]
+        return self._pattern.findall(text.lower())
+
+    def count(self, contents):
+        """
+        统计所有评论中的关键词，返回Counter
+        """
+        counter = Counter()
+        texts = [text for text in contents if isinstance(text, str)]
+
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+
+            if self.ngram == 1 and self.tokenizer is None:
+                # 整批只调用一次正则；停用词留到计数后统一剔除
+                counter.update(self._pattern.findall('\n'.join(batch).lower()))
+            elif self.ngram == 1:
+                for text in batch:
+                    counter.update(self._tokenize(text))
+            else:
+                # 词组不能跨越评论边界，且由去除停用词后相邻的词组成
+                for text in batch:
+                    words = [w for w in self._tokenize(text) if w not in self.stop_words]
+                    counter.update(' '.join(words[i:i + self.ngram])
+                                   for i in range(len(words) - self.ngram + 1))
+
+        if self.ngram == 1:
+            for word in self.stop_words:
+                counter.pop(word, None)
+
+        return counter
+
+    def top(self, contents, n=20):
+        return dict(self.count(contents).most_common(n))
+
+    @property
+    def signature(self):
+        """
+        统计方式的标识；变化后本地库中按天汇总的关键词计数需要重建
+        """
+        tokenizer = getattr(self.tokenizer, '__qualname__', repr(self.tokenizer)) if self.tokenizer else None
+        config = [self.lang, self.ngram, self.min_length, sorted(self.stop_words), tokenizer]
+        return hashlib.sha256(json.dumps(config, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+class NearDuplicateDetector:
+    """
+    用MinHash + LSH把近似重复的评论（刷评、复制粘贴）归为一组，耗时约与评论数成线性，不做两两比较
+    评论切分为相邻词二元组（shingle），分块向量化计算num_perm个MinHash值；签名分成若干段，
+    某段完全相同的评论落入同一个桶，桶内评论与桶首及前一条评论比较签名相似度，达到threshold的评论对
+    按连通分量归为一组；都不相似的评论在桶内剩余的评论中再选桶首比较，直到桶内每条评论都已验证过
+
+    参数:
+        threshold: 判定为近似重复的Jaccard相似度（估计值）下限
+        num_perm: MinHash哈希函数个数
+        seed: 哈希函数的随机种子
+    """
+
+    def __init__(self, threshold=DEDUPE_THRESHOLD, num_perm=DEDUPE_NUM_PERM, seed=1):
+        import numpy as np
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+
+        # 分段方式：b段、每段r行时，相似度为s的评论对成为候选的概率为 1 - (1 - s^r)^b；
+        # 候选曲线需落在验证阈值之下，取使相似度为threshold的评论对至少以DEDUPE_CANDIDATE_RECALL概率成为候选的最大r
+        self.rows = max([r for r in range(2, num_perm + 1) if num_perm % r == 0 and
+                         1 - (1 - threshold ** r) ** (num_perm // r) >= DEDUPE_CANDIDATE_RECALL], default=1)
+        self.bands = num_perm // self.rows
+
+        # 乘法移位哈希 h(x) = (a * x + b) mod 2^64 >> 32，uint64运算自然回绕
+        rng = np.random.default_rng(seed)
+        max_value = np.iinfo(np.uint64).max
+        self._a = rng.integers(max_value, size=(num_perm, 1), dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self._b = rng.integers(max_value, size=(num_perm, 1), dtype=np.uint64, endpoint=True)
+        self._band_weights = rng.integers(max_value, size=self.rows, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self._char_weights = rng.integers(max_value, size=CHAR_WEIGHT_COUNT, dtype=np.uint64,
+                                          endpoint=True) | np.uint64(1)
+
+    def shingle_hashes(self, contents, offset=0):
+        """
+        一批评论的shingle哈希值按评论顺序拼接，返回 (哈希数组, 每条评论的shingle数)
+        整批评论拼接后一次转换为码点数组，分词和哈希全部向量化，不为每个词创建字符串：
+        词为连续的非分隔字符（中日韩文字逐字成词），shingle为同一评论中相邻的两个词，只有一个词时为该词本身；
+        重复的shingle不去重（不影响MinHash取最小值）；没有词的评论使用各不相同的哈希（offset为批次起始下标）
+        """
+        import numpy as np
+
+        # '\0'为评论之间的分隔符，评论中本身含有的'\0'替换为空格
+        text = '\0'.join(text.replace('\0', ' ') if isinstance(text, str) else '' for text in contents)
+        text = text.lower().translate(SHINGLE_SEPARATORS) + '\0'
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+        is_separator = codes == 0
+        is_word = ~is_separator & (codes != 32)
+        is_cjk = np.zeros(len(codes), dtype=bool)
+        for low, high in CJK_RANGES:
+            is_cjk |= (codes >= low) & (codes <= high)
+
+        # 词的起点：前一个字符不属于词，或当前/前一个字符是中日韩文字
+        is_start = is_word & ~np.r_[False, is_word[:-1]]
+        is_start |= is_word & (is_cjk | np.r_[False, is_cjk[:-1]])
+
+        # 词的哈希：词内各字符码点按位置乘以不同的奇数权重后求和（uint64回绕）
+        word_chars = np.flatnonzero(is_word)
+        word_starts = np.flatnonzero(is_start[word_chars])
+        positions = np.arange(len(word_chars)) - np.repeat(word_starts, np.diff(np.r_[word_starts, len(word_chars)]))
+        weighted = codes[word_chars].astype(np.uint64) * self._char_weights[np.minimum(positions, CHAR_WEIGHT_COUNT - 1)]
+        word_hashes = np.add.reduceat(weighted, word_starts) if len(word_starts) else weighted[:0]
+
+        word_reviews = np.cumsum(is_separator)[word_chars[word_starts]] - is_separator[word_chars[word_starts]]
+        word_counts = np.bincount(word_reviews, minlength=len(contents))
+
+        # 相邻两个词属于同一条评论时组成一个shingle
+        same_review = np.flatnonzero(word_reviews[:-1] == word_reviews[1:])
+        bigrams = word_hashes[same_review] * self._band_weights[0] + word_hashes[same_review + 1]
+
+        single = np.flatnonzero(word_counts == 1)
+        empty = np.flatnonzero(word_counts == 0)
+        first_words = np.cumsum(word_counts) - word_counts
+
+        values = np.concatenate([bigrams, word_hashes[first_words[single]],
+                                 (empty + offset).astype(np.uint64) * self._b[0, 0] + self._a[0, 0]])
+        reviews = np.concatenate([word_reviews[same_review], single, empty])
+        order = np.argsort(reviews, kind='stable')
+
+        return values[order], np.bincount(reviews, minlength=len(contents))
+
+    def signatures(self, contents):
+        """
+        每条评论的MinHash签名，形状为 (评论数, num_perm) 的uint32数组；按DEDUPE_BLOCK_SIZE条一块计算
+        """
+        import numpy as np
+
+        signatures = np.empty((len(contents), self.num_perm), dtype=np.uint32)
+        for block in range(0, len(contents), DEDUPE_BLOCK_SIZE):
+            hashes, lengths = self.shingle_hashes(contents[block:block + DEDUPE_BLOCK_SIZE], offset=block)
+            values = (self._a * hashes + self._b) >> np.uint64(32)
+            # 每条评论取其shingle哈希值的最小值
+            signatures[block:block + len(lengths)] = np.minimum.reduceat(
+                values, np.cumsum(lengths) - lengths, axis=1).T
+
+        return signatures
+
+    def groups(self, contents, weights=None):
+        """
+        返回每条评论所属组的代表评论下标（numpy数组，代表指向自身）；
+        提供weights（如点赞数）时组内权重最大的评论为代表，否则为组内下标最小的评论
+        """
+        import numpy as np
+
+        signatures = self.signatures(contents)
+        count = len(signatures)
+        labels = np.arange(count)
+        if count < 2:
+            return labels
+        left, right = [], []
+
+        for band in range(self.bands):
+            block = signatures[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+            keys = (block * self._band_weights).sum(axis=1)
+            # 每段按不同的随机顺序选桶首，同一条评论在各段中与不同的评论比较
+            priority = np.random.default_rng(band).permutation(count)
+
+            # 每轮桶内未验证的评论与桶首比较；不相似的留到下一轮，在同一桶的剩余评论中重新选桶首
+            remaining = np.arange(count)
+            while len(remaining) > 1:
+                remaining = remaining[np.lexsort((priority[remaining], keys[remaining]))]
+                sorted_keys = keys[remaining]
+                is_member = np.r_[False, sorted_keys[1:] == sorted_keys[:-1]]
+                leaders = remaining[np.maximum.accumulate(np.where(is_member, 0, np.arange(len(remaining))))]
+                members, member_leaders = remaining[is_member], leaders[is_member]
+                neighbors = remaining[np.flatnonzero(is_member) - 1]
+
+                # 同时与桶首和桶内前一条评论比较，相似的评论对都参与合并
+                leader_similar = (signatures[members] == signatures[member_leaders]).mean(axis=1) >= self.threshold
+                neighbor_similar = (signatures[members] == signatures[neighbors]).mean(axis=1) >= self.threshold
+                left.extend([members[leader_similar], members[neighbor_similar]])
+                right.extend([member_leaders[leader_similar], neighbors[neighbor_similar]])
+                remaining = members[~(leader_similar | neighbor_similar)]
+
+        # 连通分量：沿相似对传播最小下标，再做指针跳跃，直到不再变化
+        left, right = np.concatenate(left), np.concatenate(right)
+        while len(left):
+            updated = labels.copy()
+            np.minimum.at(updated, left, labels[right])
+            np.minimum.at(updated, right, labels[left])
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+
+        if weights is None:
+            return labels
+
+        # 每组按权重从大到小排序后的第一条作为代表
+        order = np.lexsort((-np.asarray(weights), labels))
+        sorted_labels = labels[order]
+        is_first = np.r_[True, sorted_labels[1:] != sorted_labels[:-1]]
+        representative = np.empty(count, dtype=np.int64)
+        representative[sorted_labels[is_first]] = order[is_first]
+
+        return representative[labels]
+
+
+class ReviewSnapshot:
+    """
+    单个应用评论的列式快照，用于离线重新分析（换prompt重生成Newsletter、调试等）
+    每列一个文件：数值列为numpy .npy，可内存映射读取；文本列为UTF-8文本加字符偏移数组，
+    加载时整体解码一次后按偏移切片。meta.json记录应用信息和获取方式
+
+    参数:
+        path: 快照目录
+    """
+
+    META_FILE = 'meta.json'
+    NUMERIC_COLUMNS = {'score': 'int8', 'thumbs_up': 'int64', 'at': 'int64'}
+    TEXT_COLUMNS = ('review_id', 'content', 'locale')
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        with open(os.path.join(path, self.META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.columns = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            for name in self.NUMERIC_COLUMNS
+        }
+
+    @classmethod
+    def write(cls, path, reviews, meta):
+        """
+        把Review列表写成快照目录：先写入临时目录，完成后再替换旧快照
+        """
+        import numpy as np
+
+        tmp_path = f'{path}.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        count = len(reviews)
+        for name, dtype in cls.NUMERIC_COLUMNS.items():
+            column = np.fromiter((getattr(review, name) for review in reviews), dtype=dtype, count=count)
+            np.save(os.path.join(tmp_path, f'{name}.npy'), column)
+
+        for name in cls.TEXT_COLUMNS:
+            values = [getattr(review, name) or '' for review in reviews]
+            offsets = np.zeros(count + 1, dtype='int64')
+            np.cumsum([len(value) for value in values], out=offsets[1:])
+            np.save(os.path.join(tmp_path, f'{name}_offsets.npy'), offsets)
+            # newline=''：原样保存评论中的换行符，字符偏移才能对得上
+            with open(os.path.join(tmp_path, f'{name}.txt'), 'w', encoding='utf-8', newline='') as f:
+                f.write(''.join(values))
+
+        with open(os.path.join(tmp_path, cls.META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, count=count), f, ensure_ascii=False, indent=2)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.columns['score'])
+
+    def text_column(self, name):
+        import numpy as np
+
+        # 早期的快照没有地区列，这些评论都来自默认地区
+        if name == 'locale' and not os.path.exists(os.path.join(self.path, 'locale.txt')):
+            return [locale_key(*DEFAULT_LOCALES[0])] * len(self)
+
+        with open(os.path.join(self.path, f'{name}.txt'), 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+        offsets = np.load(os.path.join(self.path, f'{name}_offsets.npy'), mmap_mode='r').tolist()
+
+        return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def to_frame(self):
+        """
+        与ReviewAnalysis相同列名的DataFrame
+        """
+        import pandas as pd
+
+        return pd.DataFrame({
+            'reviewId': self.text_column('review_id'),
+            'content': self.text_column('content'),
+            'score': self.columns['score'],
+            'thumbsUpCount': self.columns['thumbs_up'],
+            'at': pd.to_datetime(self.columns['at'], unit='s'),
+            'locale': pd.Categorical(self.text_column('locale')),
+        })
+
+    def __iter__(self):
+        for review_id, content, score, thumbs_up, at, locale in zip(
+                self.text_column('review_id'), self.text_column('content'),
+                self.columns['score'].tolist(), self.columns['thumbs_up'].tolist(),
+                self.columns['at'].tolist(), self.text_column('locale')):
+            yield Review(review_id, content, score, thumbs_up, at, locale)
+
+
+class ReviewAnalysis:
+    """
+    每个应用只构建一次的评论分析结果
+    包含只保留分析所需列的类型化DataFrame，以及预先计算好的聚合（评分分布、情感分布、
+    每日统计、关键词）；analyze_reviews、prepare_research_data 和 create_visualizations
+    都从这里读取，不再各自重复构建DataFrame、计算情感和按日期分组
+    """
+
+    def __init__(self, reviews_data, keyword_extractor=None, duplicate_detector=None):
+        import numpy as np
+        import pandas as pd
+
+        if isinstance(reviews_data, ReviewSnapshot):
+            df = reviews_data.to_frame()
+        else:
+            # 直接由Review的各字段构建列，不经过中间字典
+            count = len(reviews_data)
+            df = pd.DataFrame({
+                'reviewId': [review.review_id for review in reviews_data],
+                'content': [review.content for review in reviews_data],
+                'score': np.fromiter((review.score for review in reviews_data), dtype='int8', count=count),
+                'thumbsUpCount': np.fromiter((review.thumbs_up for review in reviews_data), dtype='int64',
+                                             count=count),
+                'at': pd.to_datetime(np.fromiter((review.at for review in reviews_data), dtype='int64',
+                                                 count=count), unit='s'),
+                'locale': pd.Categorical([review.locale for review in reviews_data]),
+            })
+        df['date'] = df['at'].dt.normalize()
+
+        # 向量化的情感分类（分类类型，每行只占1字节）
+        df['sentiment'] = pd.Categorical.from_codes(
+            np.select([df['score'] <= 2, df['score'] == 3], [0, 1], default=2),
+            categories=SENTIMENT_LABELS
+        )
+
+        self.frame = df
+
+        # 基础统计
+        self.total_reviews = len(df)
+        self.average_rating = df['score'].mean()
+        self.total_thumbs_up = df['thumbsUpCount'].sum()
+        self.rating_counts = df['score'].value_counts().sort_index()
+
+        sentiment_counts = df['sentiment'].value_counts()
+        self.sentiment_counts = sentiment_counts[sentiment_counts > 0]
+
+        # 每日趋势（一次分组同时得到评论数、平均分和各情感条数）
+        daily = df.assign(negative=df['score'] <= 2, neutral=df['score'] == 3).groupby('date').agg(
+            mean=('score', 'mean'), count=('score', 'count'), negative=('negative', 'sum'),
+            neutral=('neutral', 'sum'))
+        daily['positive'] = daily['count'] - daily['negative'] - daily['neutral']
+        daily.index = daily.index.date
+        self.daily = daily
+
+        # 各地区的评论数、平均分和负面占比
+        self.locale_stats = df.assign(negative=df['score'] <= 2).groupby('locale', observed=True).agg(
+            count=('score', 'count'), mean=('score', 'mean'), negative=('negative', 'mean'))
+
+        # 近似重复的评论只保留组内点赞最多的一条作为代表（附组内条数），关键词和样本只看代表，
+        # 刷评和复制粘贴的评论不再放大关键词计数或占满样本；以上统计仍计入全部评论
+        self.duplicate_reviews = 0
+        self.duplicate_groups = 0
+        representatives = df
+        if duplicate_detector is not None and len(df):
+            representative = duplicate_detector.groups(df['content'].tolist(), df['thumbsUpCount'].to_numpy())
+            multiplicity = np.bincount(representative, minlength=len(df))
+            is_representative = representative == np.arange(len(df))
+            representatives = df[is_representative].assign(duplicates=multiplicity[is_representative])
+            self.duplicate_reviews = len(df) - len(representatives)
+            self.duplicate_groups = int((multiplicity > 1).sum())
+        self.representatives = representatives
+
+        # 评论中的常见词汇（排除常见停用词）
+        keyword_extractor = keyword_extractor or KeywordExtractor()
+        self.top_keywords = keyword_extractor.top(representatives['content'].tolist(), 20)
+
+    @property
+    def daily_counts(self):
+        return self.daily['count']
 
-    # 检查Python版本
-    python_version = sys.version_info
-    print(f"\nPython版本: {python_version.major}.{python_version.minor}.{python_version.micro}")
+    @property
+    def daily_avg(self):
+        return self.daily['mean']
 
-    if python_version.major < 3 or (python_version.major == 3 and python_version.minor < 8):
-        print("❌ 错误：需要Python 3.8或更高版本")
-        print("请访问 https://www.python.org/downloads/ 下载最新版本")
-        sys.exit(1)
-    else:
-        print("✓ Python版本符合要求")
+    def to_analysis_dict(self):
+        """
+        返回analyze_reviews对外提供的分析字典
+        """
+        daily_stats = self.daily.round(2)
+
+        return {
+            'total_reviews': self.total_reviews,
+            'average_rating': self.average_rating,
+            'rating_distribution': self.rating_counts.to_dict(),
+            'total_thumbs_up': self.total_thumbs_up,
+            'sentiment_distribution': self.sentiment_counts.to_dict(),
+            'top_keywords': self.top_keywords,
+            'daily_trends': {
+                ('score', 'mean'): daily_stats['mean'].to_dict(),
+                ('score', 'count'): daily_stats['count'].to_dict()
+            },
+            'locale_breakdown': locale_breakdown(self.locale_stats),
+            'duplicate_reviews': self.duplicate_reviews,
+            'duplicate_groups': self.duplicate_groups
+        }
 
-    print("\n检查依赖包:")
-    print("-" * 80)
+    def top_samples(self, sentiment, n):
+        """
+        指定情感中点赞数最高的n条评论
+        """
+        return self.sample_reviews({sentiment: n})[sentiment]
 
-    for import_name, package_name in required_packages.items():
-        try:
-            module = __import__(import_name)
-            version = getattr(module, '__version__', 'unknown')
-            print(f"✓ {package_name:30s} 版本: {version}")
-            installed_packages.append(package_name)
-        except ImportError:
-            print(f"✗ {package_name:30s} 未安装")
-            missing_packages.append(package_name)
+    def sample_reviews(self, sizes):
+        """
+        一次分组同时选出各情感中点赞数最高的评论，sizes为 {情感: 条数}，返回 {情感: [样本, ...]}
+        合并了近似重复评论时只从代表中选取，样本附带组内条数duplicates
+        """
+        df = self.representatives
+        samples = {sentiment: [] for sentiment in sizes}
+        if not sizes or not len(df):
+            return samples
+
+        top = df['thumbsUpCount'].groupby(df['sentiment'], observed=True).nlargest(max(sizes.values()))
+        rows = df.loc[top.index.get_level_values(-1)]
+
+        for row in rows.itertuples(index=False):
+            selected = samples.get(row.sentiment)
+            if selected is not None and len(selected) < sizes[row.sentiment]:
+                sample = {
+                    'content': str(row.content),
+                    'score': int(row.score),
+                    'thumbs_up': int(row.thumbsUpCount)
+                }
+                if 'duplicates' in df:
+                    sample['duplicates'] = int(row.duplicates)
+                selected.append(sample)
+
+        return samples
+
+
+class HeavyHittersSketch:
+    """
+    Misra-Gries频繁项摘要：最多保留capacity个计数器，
+    超出时所有计数减去第capacity+1大的计数并丢弃不再为正的项；
+    任何词的计数误差不超过累计扣减量（self.error）
+    """
 
-    print("-" * 80)
-    print(f"已安装: {len(installed_packages)}/{len(required_packages)}")
+    def __init__(self, capacity=KEYWORD_SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counters = Counter()
+        self.error = 0
 
-    if missing_packages:
-        print("\n" + "=" * 80)
-        print(f"⚠️  发现 {len(missing_packages)} 个缺失的依赖包")
-        print("=" * 80)
+    def update(self, counts):
+        self.counters.update(counts)
 
-        for i, pkg in enumerate(missing_packages, 1):
-            print(f"  {i}. {pkg}")
+        if len(self.counters) > self.capacity:
+            threshold = heapq.nlargest(self.capacity + 1, self.counters.values())[-1]
+            self.counters = Counter({key: value - threshold
+                                     for key, value in self.counters.items() if value > threshold})
+            self.error += threshold
 
-        print("\n选项:")
-        print("  [y] 自动安装缺失的包（推荐）")
-        print("  [n] 手动安装（程序将退出）")
-        print("  [q] 退出程序")
+    def most_common(self, n):
+        return self.counters.most_common(n)
 
-        while True:
-            install_choice = input("\n请选择 (y/n/q): ").strip().lower()
 
-            if install_choice == 'q':
-                print("\n程序已退出。")
-                sys.exit(0)
+class StreamingReviewAnalysis:
+    """
+    流式评论分析：逐页消费评论，只保留固定大小的状态
+    （评分直方图、累计和、每日计数、关键词频繁项摘要、每种情感点赞最高的N条样本），
+    对外提供与ReviewAnalysis相同的属性和方法，可直接用于研究数据和图表
+    """
 
-            elif install_choice == 'n':
-                print("\n请手动安装缺失的包:")
-                print("\n方法1 - 一键安装全部:")
-                print(f"  pip install {' '.join(missing_packages)}")
-                print("\n方法2 - 使用requirements.txt:")
-                print("  pip install -r requirements.txt")
-                print("\n安装完成后，请重新运行程序。")
-                sys.exit(1)
+    def __init__(self, keyword_extractor=None, sample_size=5, sketch_capacity=KEYWORD_SKETCH_CAPACITY):
+        self.keyword_extractor = keyword_extractor or KeywordExtractor()
+        self.sample_size = sample_size
+        self.total_reviews = 0
+        self.total_thumbs_up = 0
+        self._score_sum = 0
+        self._rating_hist = [0] * 6
+        self._daily = {}
+        # 地区 -> [评论数, 评分和, 负面数]
+        self._locales = {}
+        self._keywords = HeavyHittersSketch(sketch_capacity)
+        self._samples = {label: [] for label in SENTIMENT_LABELS}
+        self._seq = 0
+
+    def update(self, page):
+        """
+        合并一页评论到运行状态
+        """
+        for review in page:
+            score = review.score
+            thumbs_up = review.thumbs_up
+
+            self.total_reviews += 1
+            self.total_thumbs_up += thumbs_up
+            self._score_sum += score
+            self._rating_hist[score] += 1
+
+            # 以天序号为键，输出时再换算成日期；[评论数, 评分和, 负面数, 中性数]
+            day = self._daily.setdefault(review.at // 86400, [0, 0, 0, 0])
+            day[0] += 1
+            day[1] += score
+            day[2] += score <= 2
+            day[3] += score == 3
+
+            locale = self._locales.setdefault(review.locale, [0, 0, 0])
+            locale[0] += 1
+            locale[1] += score
+            locale[2] += score <= 2
+
+            # 每种情感维护一个大小为sample_size的小顶堆，堆顶是当前入选样本中点赞最少的
+            sentiment = SENTIMENT_LABELS[0 if score <= 2 else (1 if score == 3 else 2)]
+            heap = self._samples[sentiment]
+            self._seq += 1
+            entry = (thumbs_up, -self._seq, review.content, score)
+            if len(heap) < self.sample_size:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        self._keywords.update(self.keyword_extractor.count([review.content for review in page]))
+
+    @property
+    def average_rating(self):
+        return self._score_sum / self.total_reviews if self.total_reviews else float('nan')
+
+    @property
+    def rating_counts(self):
+        import pandas as pd
+        return pd.Series({score: count for score, count in enumerate(self._rating_hist) if count},
+                         dtype='int64')
+
+    @property
+    def sentiment_counts(self):
+        import pandas as pd
+        counts = pd.Series({
+            '负面': sum(self._rating_hist[1:3]),
+            '中性': self._rating_hist[3],
+            '正面': sum(self._rating_hist[4:6])
+        }).sort_values(ascending=False, kind='stable')
+        return counts[counts > 0]
+
+    @property
+    def daily(self):
+        import pandas as pd
+        days = sorted(self._daily)
+        return pd.DataFrame({
+            'mean': [self._daily[day][1] / self._daily[day][0] for day in days],
+            'count': [self._daily[day][0] for day in days],
+            'negative': [self._daily[day][2] for day in days],
+            'neutral': [self._daily[day][3] for day in days],
+            'positive': [self._daily[day][0] - self._daily[day][2] - self._daily[day][3] for day in days]
+        }, index=[from_epoch_seconds(day * 86400).date() for day in days])
+
+    @property
+    def daily_counts(self):
+        return self.daily['count']
+
+    @property
+    def daily_avg(self):
+        return self.daily['mean']
+
+    @property
+    def locale_stats(self):
+        import pandas as pd
+        locales = list(self._locales)
+        return pd.DataFrame({
+            'count': [self._locales[locale][0] for locale in locales],
+            'mean': [self._locales[locale][1] / self._locales[locale][0] for locale in locales],
+            'negative': [self._locales[locale][2] / self._locales[locale][0] for locale in locales]
+        }, index=locales)
+
+    @property
+    def top_keywords(self):
+        return dict(self._keywords.most_common(20))
+
+    def to_analysis_dict(self):
+        daily_stats = self.daily.round(2)
+
+        return {
+            'total_reviews': self.total_reviews,
+            'average_rating': self.average_rating,
+            'rating_distribution': self.rating_counts.to_dict(),
+            'total_thumbs_up': self.total_thumbs_up,
+            'sentiment_distribution': self.sentiment_counts.to_dict(),
+            'top_keywords': self.top_keywords,
+            'daily_trends': {
+                ('score', 'mean'): daily_stats['mean'].to_dict(),
+                ('score', 'count'): daily_stats['count'].to_dict()
+            },
+            'locale_breakdown': locale_breakdown(self.locale_stats)
+        }
 
-            elif install_choice == 'y':
-                print("\n" + "=" * 80)
-                print("开始自动安装依赖包...")
-                print("=" * 80)
+    def top_samples(self, sentiment, n):
+        return [
+            {
+                'content': str(content),
+                'score': score,
+                'thumbs_up': thumbs_up
+            }
+            for thumbs_up, _, content, score in sorted(self._samples[sentiment], reverse=True)[:n]
+        ]
 
-                failed_packages = []
+    def sample_reviews(self, sizes):
+        """
+        各情感的样本已在update时各用一个小顶堆选出，sizes为 {情感: 条数}
+        """
+        return {sentiment: self.top_samples(sentiment, n) for sentiment, n in sizes.items()}
 
-                for i, pkg in enumerate(missing_packages, 1):
-                    try:
-                        print(f"\n[{i}/{len(missing_packages)}] 正在安装 {pkg}...")
-                        result = subprocess.check_output(
-                            [sys.executable, "-m", "pip", "install", pkg],
-                            stderr=subprocess.STDOUT,
-                            text=True
-                        )
-                        print(f"✓ {pkg} 安装成功")
-                    except subprocess.CalledProcessError as e:
-                        print(f"✗ {pkg} 安装失败")
-                        print(f"错误信息: {e.output}")
-                        failed_packages.append(pkg)
 
-                print("\n" + "=" * 80)
+class RollupAnalysis(StreamingReviewAnalysis):
+    """
+    基于本地库按天汇总表的评论分析：窗口内完整的天直接读取汇总行，
+    只有窗口起点所在的一天从评论表统计，耗时与窗口覆盖的天数成正比而与评论条数无关；
+    对外提供与ReviewAnalysis相同的属性和方法
+
+    参数:
+        store: ReviewStore（关键词统计方式沿用store.keyword_extractor）
+        app_id: 应用ID
+        locales: [(语言, 国家), ...]
+        since: update模式下窗口的起始时间
+        limit: recent模式下的评论条数（所有地区合并后最新的limit条）
+        sample_size: 每种情感的样本条数
+    """
 
-                if failed_packages:
-                    print(f"⚠️  {len(failed_packages)} 个包安装失败:")
-                    for pkg in failed_packages:
-                        print(f"  - {pkg}")
-                    print("\n请尝试手动安装:")
-                    print(f"  pip install {' '.join(failed_packages)}")
+    def __init__(self, store, app_id, locales, since=None, limit=None, sample_size=5):
+        super().__init__(store.keyword_extractor, sample_size)
+        self.store = store
+        self.app_id = app_id
+        self.locales = list(locales)
+        # 关键词为精确计数，不需要频繁项摘要
+        self._keywords = Counter()
 
-                    continue_choice = input("\n是否继续运行程序？(y/n): ").strip().lower()
-                    if continue_choice != 'y':
-                        sys.exit(1)
-                else:
-                    print("✓ 所有依赖包安装成功！")
+        for lang, country in self.locales:
+            store.ensure_rollups(app_id, lang, country)
 
-                print("=" * 80)
-                break
-            else:
-                print("❌ 无效输入，请输入 y, n 或 q")
-    else:
-        print("\n✓ 所有依赖包已正确安装")
+        self.window = store.window_start(app_id, self.locales, since=since, limit=limit)
+        if self.window is None:
+            return
 
-    print("\n" + "=" * 80 + "\n")
+        first_day = self.window[0][:10]
+        for lang, country, day, count, score_sum, *stars, thumbs_up_sum in \
+                store.rollup_rows(app_id, self.locales, first_day):
+            self._add_day(locale_key(lang, country), day, count, score_sum, stars, thumbs_up_sum)
+        self._keywords.update(store.rollup_keywords(app_id, self.locales, first_day))
+
+        # 窗口起点所在的一天只统计落在窗口内的评论
+        contents = []
+        for lang, country, at, score, thumbs_up, content in store.window_day_reviews(app_id, self.locales,
+                                                                                     self.window):
+            stars = [int(score == star) for star in range(1, 6)]
+            self._add_day(locale_key(lang, country), at[:10], 1, score or 0, stars, thumbs_up or 0)
+            contents.append(content)
+        self._keywords.update(self.keyword_extractor.count(contents))
+
+        # 多个地区共有的评论在各地区的汇总中都计入了一次，扣除靠后地区的副本
+        if len(self.locales) > 1:
+            contents = []
+            for lang, country, at, score, thumbs_up, content in store.duplicate_window_reviews(
+                    app_id, self.locales, self.window):
+                stars = [-int(score == star) for star in range(1, 6)]
+                self._add_day(locale_key(lang, country), at[:10], -1, -(score or 0), stars, -(thumbs_up or 0))
+                contents.append(content)
+            if contents:
+                self._keywords.subtract(self.keyword_extractor.count(contents))
+                self._keywords = +self._keywords
+                self._daily = {day: stats for day, stats in self._daily.items() if stats[0]}
+                self._locales = {locale: stats for locale, stats in self._locales.items() if stats[0]}
+
+    def _add_day(self, locale, day, count, score_sum, stars, thumbs_up_sum):
+        self.total_reviews += count
+        self.total_thumbs_up += thumbs_up_sum
+        self._score_sum += score_sum
+        for score, star_count in enumerate(stars, 1):
+            self._rating_hist[score] += star_count
+
+        # 与流式分析相同，以天序号为键
+        daily = self._daily.setdefault((datetime.strptime(day, '%Y-%m-%d') - EPOCH).days, [0, 0, 0, 0])
+        daily[0] += count
+        daily[1] += score_sum
+        daily[2] += stars[0] + stars[1]
+        daily[3] += stars[2]
+
+        stats = self._locales.setdefault(locale, [0, 0, 0])
+        stats[0] += count
+        stats[1] += score_sum
+        stats[2] += stars[0] + stars[1]
+
+    def top_samples(self, sentiment, n):
+        return self.sample_reviews({sentiment: n})[sentiment]
+
+    def sample_reviews(self, sizes):
+        """
+        一次查询同时选出各情感中点赞数最高的评论，sizes为 {情感: 条数}
+        """
+        samples = {sentiment: [] for sentiment in sizes}
+        if self.window is None or not sizes:
+            return samples
 
+        for sentiment_index, content, score, thumbs_up in self.store.top_window_reviews(
+                self.app_id, self.locales, self.window, max(sizes.values())):
+            selected = samples.get(SENTIMENT_LABELS[sentiment_index])
+            if selected is not None and len(selected) < sizes[SENTIMENT_LABELS[sentiment_index]]:
+                selected.append({
+                    'content': str(content),
+                    'score': score,
+                    'thumbs_up': thumbs_up or 0
+                })
 
-# 在导入其他包之前先检查依赖
-check_and_install_dependencies()
+        return samples
 
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
-from google_play_scraper import app, reviews_all
-import pandas as pd
-import matplotlib.pyplot as plt
-from collections import Counter
-import re
-import os
-import json
-import google.generativeai as genai
 
-# Set Chinese font for matplotlib
-plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'STHeiti']
-plt.rcParams['axes.unicode_minus'] = False
+def timed_stage(stage):
+    """
+    方法装饰器：把方法耗时累加到监控器metrics中的对应阶段（异常退出也计入）
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.record_stage_time(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
 
 
 class PlayStoreMonitor:
-    def __init__(self, app_id, gemini_api_key=None, analysis_mode='update'):
+    def __init__(self, app_id, gemini_api_key=None, analysis_mode='update', recent_count=100, store=None,
+                 rate_limiter=None, metadata_cache=None, gemini_cache=None, keyword_extractor=None,
+                 streaming=False, chart_format='png', chart_dpi=None, force_render=False, snapshot_dir=None,
+                 from_snapshot=False, retry_policy=None, circuit_breaker=None, locales=None,
+                 prompt_token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, gemini_timeout=DEFAULT_GEMINI_TIMEOUT,
+                 duplicate_detector=None):
         """
         初始化监控器，输入Google Play应用ID
         示例: 'com.yg.mini.games'
@@ -153,22 +2277,151 @@ class PlayStoreMonitor:
         参数:
             app_id: 应用ID
             gemini_api_key: Gemini API密钥
-            analysis_mode: 'update' (更新后评论) 或 'recent' (最近100条)
+            analysis_mode: 'update' (更新后评论) 或 'recent' (最近N条)
+            recent_count: recent模式下获取的评论条数
+            store: 可选的ReviewStore，提供时只增量拉取比上次同步更新的评论
+            rate_limiter: 可选的RateLimiter，批量并发时由所有应用共享
+            metadata_cache: 可选的MetadataCache，有效期内不再请求应用详情页
+            gemini_cache: 可选的GeminiCache，prompt相同时直接复用上次生成的结果
+            keyword_extractor: 可选的KeywordExtractor（语言、n-gram、分词方式），默认英文单词
+            streaming: 为True时评论边获取边分析，只保留固定大小的统计状态，不保存评论列表
+            chart_format: 图表格式，见CHART_FORMATS（png、preview、svg、html）
+            chart_dpi: 覆盖图表格式的默认DPI
+            force_render: 为True时即使图表数据未变化也重新渲染
+            snapshot_dir: 快照目录；提供时获取评论后保存列式快照
+            from_snapshot: 为True时从snapshot_dir中的快照读取评论，完全不访问网络
+            retry_policy: 可选的RetryPolicy，默认重试DEFAULT_MAX_RETRIES次
+            circuit_breaker: 可选的CircuitBreaker，批量并发时由所有应用共享
+            locales: 抓取的评论地区 [(语言, 国家), ...]，默认DEFAULT_LOCALES；多个地区并发抓取并按reviewId去重
+            prompt_token_budget: Gemini prompt的token预算（估算），样本评论按预算截断
+            gemini_timeout: 调用Gemini的时限（秒，含重试），超时后生成不含AI分析的Newsletter
+            duplicate_detector: 可选的NearDuplicateDetector；提供时近似重复的评论在关键词和样本中只计一次
+                                （需要逐条评论，因此不使用流式统计和本地库汇总表）
         """
         self.app_id = app_id
         self.app_info = None
         self.last_update_date = None
         self.reviews_data = None
+        self.review_analysis = None
+        # 每日汇总（评论数、平均分、各情感条数），释放评论后仍保留，供多应用组合分析使用
+        self.daily_stats = None
         self.gemini_api_key = gemini_api_key
         self.analysis_mode = analysis_mode
-
+        self.recent_count = recent_count
+        self.store = store
+        self.rate_limiter = rate_limiter
+        self.metadata_cache = metadata_cache
+        self.gemini_cache = gemini_cache
+        self.keyword_extractor = keyword_extractor
+        self.streaming = streaming
+        self.chart_format = chart_format
+        self.chart_dpi = chart_dpi
+        self.force_render = force_render
+        self.snapshot_dir = snapshot_dir
+        self.from_snapshot = from_snapshot
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+        self.locales = list(locales or DEFAULT_LOCALES)
+        self.prompt_token_budget = prompt_token_budget
+        self.gemini_timeout = gemini_timeout
+        self.duplicate_detector = duplicate_detector
+        # 本次分析各阶段的耗时（秒）、阶段内部的延迟（秒，如Gemini首个响应块，不计入总耗时）
+        # 和计数（页数、评论数、prompt字符数、重试、缓存命中等）；多地区并发抓取时会在多个线程中计数，因此加锁
+        self.metrics = {'stages': {}, 'latencies': {}, 'counters': {'retries': 0}}
+        self._metrics_lock = threading.Lock()
+
+    def record_stage_time(self, stage, seconds):
+        with self._metrics_lock:
+            stages = self.metrics['stages']
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def record_latency(self, name, seconds):
+        with self._metrics_lock:
+            self.metrics['latencies'][name] = seconds
+
+    def count_metric(self, name, amount=1):
+        with self._metrics_lock:
+            counters = self.metrics['counters']
+            counters[name] = counters.get(name, 0) + amount
+
+    def call_with_retry(self, description, func, *args, is_suspect=None, is_fatal=None, shared=True, deadline=None,
+                        **kwargs):
+        """
+        经过熔断器和限速器发起网络调用，失败时按retry_policy指数退避重试
+        参数:
+            is_suspect: 可选的判定函数；返回值像是被吞掉的错误时（见iter_review_pages）同样重试，
+                        但不计入熔断器和限速器（也可能确实没有数据），重试用尽后才记一次失败并返回最后一次的结果
+            is_fatal: 可选的判定函数；对其返回True的异常立即抛出，不重试，也不计入熔断器和限速器
+                      （如已超过时限、API Key无效）
+            shared: 为False时不经过批次共享的熔断器和限速器（Gemini调用，LLM的慢响应和失败不应拖慢评论抓取）
+            deadline: 可选的time.monotonic()截止时刻；重试前的退避等待不超过剩余时间
+        重试用尽仍抛出异常时，异常原样抛给调用方
+        """
+        max_retries = self.retry_policy.max_retries
+        circuit_breaker = self.circuit_breaker if shared else None
+        rate_limiter = self.rate_limiter if shared else None
+
+        for attempt in range(max_retries + 1):
+            if circuit_breaker is not None:
+                circuit_breaker.wait()
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+
+            error = None
+            suspect = False
+            try:
+                result = func(*args, **kwargs)
+                suspect = is_suspect is not None and is_suspect(result)
+            except Exception as e:
+                if is_fatal is not None and is_fatal(e):
+                    raise
+                result, error = None, e
+
+            if not suspect:
+                if circuit_breaker is not None:
+                    circuit_breaker.record(error is None)
+                if rate_limiter is not None:
+                    if error is None:
+                        rate_limiter.speed_up()
+                    else:
+                        rate_limiter.slow_down()
+
+            if error is None and not suspect:
+                return result
+            if attempt == max_retries:
+                if error is not None:
+                    raise error
+                if circuit_breaker is not None:
+                    circuit_breaker.record(False)
+                return result
+
+            delay = self.retry_policy.backoff(attempt)
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            self.count_metric('retries')
+            print(f"⚠️  {description}失败（{error or '返回空结果'}），{delay:.1f}秒后第{attempt + 1}次重试")
+            time.sleep(delay)
+
+    @timed_stage('app_details')
     def get_last_update_date(self):
         """
         获取应用在Google Play商店的最后更新日期
         """
         try:
-            # 获取应用信息
-            self.app_info = app(self.app_id)
+            # 获取应用信息（优先使用未过期的缓存）
+            cached_info = self.metadata_cache.get(self.app_id) if self.metadata_cache else None
+
+            if cached_info:
+                self.app_info = cached_info
+                self.count_metric('metadata_cache_hits')
+                print("✓ 使用缓存的应用信息")
+            else:
+                self.count_metric('app_detail_requests')
+                self.app_info = self.call_with_retry("获取应用详情", fetch_app_details, self.app_id,
+                                                    is_fatal=is_fatal_play_store_error)
+                if self.metadata_cache:
+                    self.metadata_cache.put(self.app_id, self.app_info)
+
             self.last_update_date = self.app_info['updated']
 
             # 转换为datetime对象
@@ -203,7 +2456,7 @@ class PlayStoreMonitor:
         """
         # 如果是recent模式，直接返回proceed
         if self.analysis_mode == 'recent':
-            print(f"✓ 使用最近100条评论模式，跳过更新日期检查")
+            print(f"✓ 使用最近{self.recent_count}条评论模式，跳过更新日期检查")
             return 'proceed'
 
         if not self.last_update_date:
@@ -232,10 +2485,247 @@ class PlayStoreMonitor:
         获取评论数据（根据analysis_mode决定获取方式）
         """
         if self.analysis_mode == 'recent':
-            return self.get_recent_reviews(count=100)
+            return self.get_recent_reviews(count=self.recent_count)
         else:
             return self.get_reviews_after_update()
 
+    def iter_review_pages(self, page_size=REVIEW_PAGE_SIZE, lang='en', country='us'):
+        """
+        按最新优先的顺序逐页获取评论（使用continuation token续取下一页），每页为Review列表
+        调用方可以在任意一页之后停止迭代，后续页面不会再被请求
+
+        google_play_scraper在分页请求出错时不抛异常，而是返回空列表和空token，与“没有更多评论”无法区分；
+        因此续取中途（已有continuation token）遇到空页且没有续取token时按疑似失败用同一个token重试
+        （不从头重新抓取），重试用尽才视为结束；第一页为空则是应用或地区确实没有评论，不重试。
+        已取得部分评论后若请求持续抛出异常，则停止分页并保留已取得的评论
+        """
+        continuation_token = None
+        pages = 0
+        locale = locale_key(lang, country)
+
+        def swallowed_error(result):
+            raw_page, next_token = result
+            return not raw_page and (next_token is None or next_token.token is None)
+
+        while True:
+            try:
+                raw_page, next_token = self.call_with_retry(
+                    "获取评论页",
+                    fetch_review_page,
+                    self.app_id,
+                    lang=lang,
+                    country=country,
+                    count=page_size,
+                    continuation_token=continuation_token,
+                    is_suspect=None if continuation_token is None else swallowed_error,
+                    is_fatal=is_fatal_play_store_error
+                )
+            except Exception as e:
+                if not pages:
+                    raise
+                print(f"⚠️  获取第{pages + 1}页评论失败（{e}），使用已获取的{pages}页评论")
+                break
+
+            continuation_token = next_token
+            pages += 1
+
+            # 进入系统即投影为精简记录，原始字典随本页丢弃
+            page = [Review.from_scraper(raw, locale) for raw in raw_page]
+            self.count_metric('review_pages')
+            self.count_metric('reviews_fetched', len(page))
+
+            if page:
+                yield page
+
+            if not page or continuation_token.token is None:
+                break
+
+    def sync_reviews_to_store(self, since=None, min_count=None, lang='en', country='us'):
+        """
+        增量同步评论到本地库：只拉取比高水位更新的评论并合并
+        参数:
+            since: 本次分析需要覆盖到的最早时间（update模式为更新日期）
+            min_count: 本次分析需要的最少评论数（recent模式）
+        返回: 本次从网络获取的评论条数
+        """
+        high_water, low_water = self.store.get_sync_state(self.app_id, lang, country)
+
+        # 已同步的范围不足以覆盖本次需求时，按首次同步处理
+        if high_water is not None:
+            if since is not None and low_water > since:
+                high_water = low_water = None
+            elif min_count is not None and \
+                    self.store.count_reviews(self.app_id, lang, country, since=low_water) < min_count:
+                high_water = low_water = None
+
+        fetched = 0
+        newest = oldest = None
+        overlapped = False
+
+        for page in self.iter_review_pages(lang=lang, country=country):
+            self.store.add_reviews(self.app_id, lang, country, page)
+            fetched += len(page)
+
+            page_newest = from_epoch_seconds(max(review.at for review in page))
+            page_oldest = from_epoch_seconds(min(review.at for review in page))
+            newest = page_newest if newest is None else max(newest, page_newest)
+            oldest = page_oldest if oldest is None else min(oldest, page_oldest)
+
+            # 已与库中连续范围衔接，更早的评论都已保存
+            if high_water is not None and page_oldest <= high_water:
+                overlapped = True
+                break
+            if since is not None and page_oldest < since:
+                break
+            if min_count is not None and fetched >= min_count:
+                break
+
+        if fetched:
+            if overlapped:
+                high_water = max(newest, high_water)
+                low_water = min(oldest, low_water)
+            else:
+                high_water, low_water = newest, oldest
+            self.store.set_sync_state(self.app_id, lang, country, high_water, low_water)
+
+        print(f"增量同步: 新拉取{fetched}条评论（本地库: {self.store.db_path}）")
+
+        return fetched
+
+    def iter_reviews_after_update(self, lang='en', country='us'):
+        """
+        逐页产出一个地区在最后更新日期之后的评论
+        按最新优先分页拉取，一旦某页跨过更新日期即停止，不再下载更早的评论
+        配置了本地库时只拉取新增评论，其余从本地库读取
+        """
+        if self.store is not None:
+            self.sync_reviews_to_store(since=self.last_update_date, lang=lang, country=country)
+            yield from self.store.iter_review_pages(self.app_id, lang, country, since=self.last_update_date)
+            return
+
+        pages_fetched = 0
+        since = to_epoch_seconds(self.last_update_date)
+
+        for page in self.iter_review_pages(lang=lang, country=country):
+            pages_fetched += 1
+
+            # 筛选更新后的评论
+            yield [review for review in page if review.at >= since]
+
+            # 本页最早的评论已早于更新日期，后面的页只会更早
+            if min(review.at for review in page) < since:
+                break
+
+        print(f"共请求{pages_fetched}页评论")
+
+    def iter_recent_reviews(self, count=100, lang='en', country='us'):
+        """
+        逐页产出一个地区最近的count条评论
+        只请求凑够count条所需的页数，不会遍历应用的全部评论
+        """
+        if self.store is not None:
+            self.sync_reviews_to_store(min_count=count, lang=lang, country=country)
+            yield from self.store.iter_review_pages(self.app_id, lang, country, limit=count)
+            return
+
+        remaining = count
+        pages_fetched = 0
+
+        for page in self.iter_review_pages(page_size=min(count, REVIEW_PAGE_SIZE), lang=lang, country=country):
+            pages_fetched += 1
+            yield page[:remaining]
+            remaining -= len(page[:remaining])
+
+            if remaining <= 0:
+                break
+
+        print(f"共请求{pages_fetched}页评论")
+
+    def iter_locale_pages(self, make_pages):
+        """
+        对self.locales中的每个地区调用make_pages(lang, country)得到分页迭代器（最新优先），
+        多个地区时各自在线程中并发抓取，按评论时间归并为最新优先的页；
+        同一reviewId出现在多个地区时归入self.locales中靠前的地区，与RollupAnalysis一致
+        归并时只等待进度最慢的地区：某条评论比每个未结束地区已产出的最早评论都新时，
+        各地区都不会再产出它，即可确定其地区并产出，缓冲的评论约为每个地区一页
+        某个地区抓取失败只影响该地区；调用方提前停止迭代（关闭生成器或处理时出错）时，
+        各地区线程在放入下一页前发现停止标记后退出，不会一直阻塞在已满的队列上
+        """
+        if len(self.locales) == 1:
+            yield from make_pages(*self.locales[0])
+            return
+
+        queues = [queue.Queue(maxsize=2) for _ in self.locales]
+        finished = object()
+        stop = threading.Event()
+
+        def put(pages, item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=LOCALE_QUEUE_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch_locale(pages, lang, country):
+            try:
+                for page in make_pages(lang, country):
+                    if not put(pages, page):
+                        break
+            except Exception as e:
+                print(f"⚠️  获取{locale_key(lang, country)}地区评论时出错: {e}")
+            finally:
+                put(pages, finished)
+
+        for pages, (lang, country) in zip(queues, self.locales):
+            threading.Thread(target=fetch_locale, args=(pages, lang, country),
+                             name=f"locale-{locale_key(lang, country)}", daemon=True).start()
+
+        # 每个地区已产出的最早评论时间：尚未产出时为+inf，结束后为-inf
+        oldest = [float('inf')] * len(self.locales)
+        pending = []  # 待确定地区的评论 (-at, reviewId) 堆
+        candidates = {}  # reviewId -> (地区下标, Review)
+        released = set()
+        try:
+            while True:
+                index = max(range(len(self.locales)), key=oldest.__getitem__)
+                if oldest[index] == float('-inf'):
+                    break
+
+                page = queues[index].get()
+                if page is finished:
+                    oldest[index] = float('-inf')
+                else:
+                    duplicates = 0
+                    for review in page:
+                        current = candidates.get(review.review_id)
+                        if current is None and review.review_id not in released:
+                            candidates[review.review_id] = (index, review)
+                            heapq.heappush(pending, (-review.at, review.review_id))
+                            continue
+                        duplicates += 1
+                        if current is not None and index < current[0]:
+                            candidates[review.review_id] = (index, review)
+                    self.count_metric('duplicate_reviews', duplicates)
+                    if page:
+                        oldest[index] = min(oldest[index], min(review.at for review in page))
+
+                # 比每个未结束地区已产出的最早评论都新的评论，其地区已确定
+                boundary = max(oldest)
+                ready = []
+                while pending and -pending[0][0] > boundary:
+                    _, review_id = heapq.heappop(pending)
+                    ready.append(candidates.pop(review_id)[1])
+                    released.add(review_id)
+                if ready:
+                    # 时间相同的评论总在同一批产出，批内按 (at, reviewId) 从新到旧排列，与本地库的窗口顺序一致
+                    ready.sort(key=lambda review: (review.at, review.review_id), reverse=True)
+                    yield ready
+        finally:
+            stop.set()
+
+    @timed_stage('fetch_reviews')
     def get_reviews_after_update(self):
         """
         获取最后更新日期到今天之间的所有评论
@@ -246,22 +2736,12 @@ class PlayStoreMonitor:
         print("\n正在获取更新后的评论... 这可能需要一些时间。")
 
         try:
-            # 获取所有评论
-            all_reviews = reviews_all(
-                self.app_id,
-                sleep_milliseconds=0,
-                lang='en',
-                country='us'
-            )
-
-            # 筛选更新后的评论
             filtered_reviews = []
-            for review in all_reviews:
-                review_date = review['at']
-                if review_date >= self.last_update_date:
-                    filtered_reviews.append(review)
+            for page in self.iter_locale_pages(self.iter_reviews_after_update):
+                filtered_reviews.extend(page)
 
             self.reviews_data = filtered_reviews
+            self.count_metric('reviews', len(filtered_reviews))
             print(f"找到{len(filtered_reviews)}条自上次更新以来的评论")
 
             return filtered_reviews
@@ -270,6 +2750,7 @@ class PlayStoreMonitor:
             print(f"获取评论时出错: {e}")
             return []
 
+    @timed_stage('fetch_reviews')
     def get_recent_reviews(self, count=100):
         """
         获取最近N条评论（不考虑更新日期）
@@ -277,21 +2758,15 @@ class PlayStoreMonitor:
         print(f"\n正在获取最近{count}条评论...")
 
         try:
-            from google_play_scraper import Sort
-
-            # 获取最近的评论
-            all_reviews = reviews_all(
-                self.app_id,
-                sleep_milliseconds=0,
-                lang='en',
-                country='us',
-                sort=Sort.NEWEST
-            )
+            recent_reviews = []
+            for page in self.iter_locale_pages(lambda lang, country: self.iter_recent_reviews(count, lang, country)):
+                recent_reviews.extend(page)
 
-            # 只取最近的N条
-            recent_reviews = all_reviews[:count] if len(all_reviews) > count else all_reviews
+            # 多个地区时取合并后（最新优先）的前count条
+            del recent_reviews[count:]
 
             self.reviews_data = recent_reviews
+            self.count_metric('reviews', len(recent_reviews))
             print(f"成功获取{len(recent_reviews)}条最近的评论")
 
             return recent_reviews
@@ -300,60 +2775,114 @@ class PlayStoreMonitor:
             print(f"获取评论时出错: {e}")
             return []
 
-    def analyze_reviews(self):
+    @timed_stage('fetch_reviews')
+    def sync_store_reviews(self):
         """
-        分析评论趋势并生成洞察
+        只把各地区的新评论同步到本地库（多个地区并发），不加载评论；
+        统计随后由analyze_reviews从按天汇总表组装。某个地区同步失败时沿用库中已有的评论
+        返回: 分析窗口内的评论条数
         """
-        if not self.reviews_data:
-            print("没有可用的评论数据。请先获取评论。")
-            return None, None
-
-        df = pd.DataFrame(self.reviews_data)
-
-        # 基础统计
-        analysis = {
-            'total_reviews': len(df),
-            'average_rating': df['score'].mean(),
-            'rating_distribution': df['score'].value_counts().sort_index().to_dict(),
-            'total_thumbs_up': df['thumbsUpCount'].sum(),
-        }
-
-        # 基于评分的情感分析
-        df['sentiment'] = df['score'].apply(lambda x:
-                                            '正面' if x >= 4 else ('中性' if x == 3 else '负面'))
+        if self.analysis_mode == 'recent':
+            print(f"\n正在同步最近{self.recent_count}条评论到本地库...")
+            since, min_count = None, self.recent_count
+        else:
+            if not self.last_update_date:
+                self.get_last_update_date()
+            print("\n正在同步更新后的评论到本地库... 这可能需要一些时间。")
+            since, min_count = self.last_update_date, None
+
+        def sync_locale(lang, country):
+            try:
+                self.sync_reviews_to_store(since=since, min_count=min_count, lang=lang, country=country)
+            except Exception as e:
+                print(f"⚠️  同步{locale_key(lang, country)}地区评论时出错: {e}")
+
+        threads = [threading.Thread(target=sync_locale, args=locale,
+                                    name=f"locale-{locale_key(*locale)}", daemon=True)
+                   for locale in self.locales[1:]]
+        for thread in threads:
+            thread.start()
+        sync_locale(*self.locales[0])
+        for thread in threads:
+            thread.join()
+
+        total = self.store.count_distinct_reviews(self.app_id, self.locales, since=since)
+        if min_count is not None:
+            total = min(total, min_count)
+
+        self.count_metric('reviews', total)
+        print(f"本地库中共有{total}条待分析的评论")
+
+        return total
+
+    @timed_stage('fetch_reviews')
+    def stream_reviews_since_update(self):
+        """
+        流式获取并分析评论：每页评论合并进StreamingReviewAnalysis后即被丢弃，
+        内存占用与评论总数无关（多个地区时另需保存已见过的reviewId用于去重）；
+        recent模式下每个地区各取最近的recent_count条，合并（最新优先）后只分析前recent_count条
+        """
+        limit = None
+        if self.analysis_mode == 'recent':
+            limit = self.recent_count
+            print(f"\n正在流式获取并分析最近{self.recent_count}条评论...")
+            pages = self.iter_locale_pages(
+                lambda lang, country: self.iter_recent_reviews(self.recent_count, lang, country))
+        else:
+            if not self.last_update_date:
+                self.get_last_update_date()
+            print("\n正在流式获取并分析更新后的评论... 这可能需要一些时间。")
+            pages = self.iter_locale_pages(self.iter_reviews_after_update)
 
-        analysis['sentiment_distribution'] = df['sentiment'].value_counts().to_dict()
+        if self.duplicate_detector is not None:
+            print("⚠️  流式模式不保留评论列表，不合并近似重复评论")
+        review_analysis = StreamingReviewAnalysis(self.keyword_extractor)
 
-        # 评论中的常见词汇（排除常见停用词）
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-                      'of', 'with', 'is', 'was', 'are', 'been', 'be', 'have', 'has', 'had',
-                      'this', 'that', 'it', 'i', 'my', 'me', 'you', 'your', 'app', 'game',
-                      'very', 'really', 'just', 'like', 'get', 'got', 'can', 'cant', 'dont',
-                      'will', 'would', 'could', 'should', 'much', 'more', 'most', 'many',
-                      'some', 'also', 'only', 'from', 'when', 'there', 'they', 'them',
-                      'than', 'then', 'these', 'those', 'what', 'which', 'who', 'where',
-                      'why', 'how', 'all', 'each', 'every', 'both', 'few', 'more', 'other',
-                      'such', 'own', 'same', 'than', 'too', 'even', 'well', 'without',
-                      'good', 'great', 'nice', 'best', 'love', 'bad', 'hate', 'worst'}
+        try:
+            for page in pages:
+                if limit is not None:
+                    page = page[:limit - review_analysis.total_reviews]
+                review_analysis.update(page)
+                if limit is not None and review_analysis.total_reviews >= limit:
+                    pages.close()
+                    break
+        except Exception as e:
+            print(f"获取评论时出错: {e}")
+            return None
 
-        all_words = []
-        for content in df['content'].dropna():
-            words = re.findall(r'\b[a-z]+\b', content.lower())
-            all_words.extend([w for w in words if w not in stop_words and len(w) > 3])
+        self.review_analysis = review_analysis
+        self.count_metric('reviews', review_analysis.total_reviews)
+        print(f"已流式分析{review_analysis.total_reviews}条评论")
 
-        analysis['top_keywords'] = dict(Counter(all_words).most_common(20))
+        return review_analysis
 
-        # 每日趋势
-        df['date'] = pd.to_datetime(df['at']).dt.date
-        daily_stats = df.groupby('date').agg({
-            'score': ['mean', 'count']
-        }).round(2)
+    @timed_stage('analyze')
+    def analyze_reviews(self):
+        """
+        分析评论趋势并生成洞察
+        返回: (analysis字典, ReviewAnalysis)，后续的研究数据和图表都复用同一个ReviewAnalysis
+        """
+        if self.streaming and self.review_analysis is not None:
+            # 流式模式下统计已在获取评论时完成
+            pass
+        elif self.reviews_data is None and self.uses_rollups():
+            # 评论只同步到了本地库时，从按天汇总表组装统计
+            since = None if self.analysis_mode == 'recent' else self.last_update_date
+            limit = self.recent_count if self.analysis_mode == 'recent' else None
+            self.review_analysis = RollupAnalysis(self.store, self.app_id, self.locales, since=since, limit=limit)
+        elif not self.reviews_data:
+            print("没有可用的评论数据。请先获取评论。")
+            return None, None
+        else:
+            self.review_analysis = ReviewAnalysis(self.reviews_data, self.keyword_extractor,
+                                                  self.duplicate_detector)
 
-        analysis['daily_trends'] = daily_stats.to_dict()
+        self.daily_stats = self.review_analysis.daily
 
-        return analysis, df
+        return self.review_analysis.to_analysis_dict(), self.review_analysis
 
-    def prepare_research_data(self, analysis, df):
+    @timed_stage('prepare_research')
+    def prepare_research_data(self, analysis, review_analysis):
         """
         准备提供给Gemini的研究数据
         """
@@ -367,45 +2896,19 @@ class PlayStoreMonitor:
         # 根据模式确定分析周期描述
         if self.analysis_mode == 'recent':
             period_description = f"最近{total_reviews}条评论"
-            days_analyzed = "N/A (最近100条模式)"
+            days_analyzed = f"N/A (最近{self.recent_count}条模式)"
         else:
             days_analyzed = (datetime.now() - self.last_update_date).days
             period_description = f"更新后{days_analyzed}天"
 
-        # 收集代表性评论
+        # 收集代表性评论（按点赞数选取，各情感一次选出）
+        samples = review_analysis.sample_reviews(SAMPLE_SIZES)
         sample_reviews = {
-            'positive': [],
-            'negative': [],
-            'neutral': []
+            'positive': samples['正面'],
+            'negative': samples['负面'],
+            'neutral': samples['中性']
         }
 
-        # 正面评论样本
-        positive_df = df[df['sentiment'] == '正面'].sort_values('thumbsUpCount', ascending=False)
-        for _, row in positive_df.head(5).iterrows():
-            sample_reviews['positive'].append({
-                'content': str(row['content']),
-                'score': int(row['score']),
-                'thumbs_up': int(row['thumbsUpCount'])
-            })
-
-        # 负面评论样本
-        negative_df = df[df['sentiment'] == '负面'].sort_values('thumbsUpCount', ascending=False)
-        for _, row in negative_df.head(5).iterrows():
-            sample_reviews['negative'].append({
-                'content': str(row['content']),
-                'score': int(row['score']),
-                'thumbs_up': int(row['thumbsUpCount'])
-            })
-
-        # 中性评论样本
-        neutral_df = df[df['sentiment'] == '中性'].sort_values('thumbsUpCount', ascending=False)
-        for _, row in neutral_df.head(3).iterrows():
-            sample_reviews['neutral'].append({
-                'content': str(row['content']),
-                'score': int(row['score']),
-                'thumbs_up': int(row['thumbsUpCount'])
-            })
-
         # 转换rating_distribution中的numpy int64为Python int
         rating_dist = {int(k): int(v) for k, v in analysis['rating_distribution'].items()}
 
@@ -413,8 +2916,8 @@ class PlayStoreMonitor:
         top_keywords = {k: int(v) for k, v in analysis['top_keywords'].items()}
 
         # 每日趋势数据
-        daily_counts = df.groupby('date').size().to_dict()
-        daily_avg_rating = df.groupby('date')['score'].mean().to_dict()
+        daily_counts = review_analysis.daily_counts.to_dict()
+        daily_avg_rating = review_analysis.daily_avg.to_dict()
 
         # 构建研究报告数据
         research_report = {
@@ -422,7 +2925,7 @@ class PlayStoreMonitor:
             'app_id': self.app_id,
             'version': self.app_info.get('version', 'N/A'),
             'last_update_date': self.last_update_date.strftime('%Y年%m月%d日') if self.last_update_date else 'N/A',
-            'analysis_mode': '最近100条评论' if self.analysis_mode == 'recent' else '更新后评论',
+            'analysis_mode': f'最近{self.recent_count}条评论' if self.analysis_mode == 'recent' else '更新后评论',
             'analysis_period_days': days_analyzed if self.analysis_mode != 'recent' else 'N/A',
             'period_description': period_description,
             'statistics': {
@@ -432,9 +2935,12 @@ class PlayStoreMonitor:
                 'negative_percentage': round(float(negative_pct), 1),
                 'neutral_percentage': round(float(neutral_pct), 1),
                 'rating_distribution': rating_dist,
-                'total_thumbs_up': int(analysis['total_thumbs_up'])
+                'total_thumbs_up': int(analysis['total_thumbs_up']),
+                'duplicate_reviews': int(analysis.get('duplicate_reviews', 0)),
+                'duplicate_groups': int(analysis.get('duplicate_groups', 0))
             },
             'top_keywords': top_keywords,
+            'locale_breakdown': analysis['locale_breakdown'],
             'sample_reviews': sample_reviews,
             'daily_trends': {
                 'review_counts': {str(k): int(v) for k, v in daily_counts.items()},
@@ -444,24 +2950,51 @@ class PlayStoreMonitor:
 
         return research_report
 
-    def call_gemini_api(self, research_data):
+    def build_gemini_prompt(self, research_data):
         """
-        调用Gemini API生成Newsletter
+        构建Prompt（精简版，要求引用具体评论）
+        样本评论每条一行，按prompt_token_budget扣除固定部分后的余量截断
         """
-        if not self.gemini_api_key:
-            print("❌ 未配置Gemini API Key")
-            return None
+        samples = research_data['sample_reviews']
+        fixed_tokens = estimate_tokens(self.render_gemini_prompt(research_data, '', ''))
+        negative, positive = self.format_prompt_samples([samples['negative'], samples['positive']],
+                                                        self.prompt_token_budget - fixed_tokens)
 
-        try:
-            # 配置Gemini
-            genai.configure(api_key=self.gemini_api_key)
-
-            # 使用Gemini 2.5 Flash（最新且快速的模型）
-            model = genai.GenerativeModel('models/gemini-2.5-flash')
-            print(f"✓ 使用模型: gemini-2.5-flash")
+        return self.render_gemini_prompt(research_data, negative, positive)
 
-            # 构建Prompt（精简版，要求引用具体评论）
-            prompt = f"""You are a professor of marketing research. Analyze the Google Play reviews and generate 3-5 sentences focusing on bugs and product feedbacks.
+    def format_prompt_samples(self, groups, budget):
+        """
+        把各组样本评论格式化为每条一行的紧凑文本，评论原文按公平份额分配budget个token
+        返回与groups对应的文本列表
+        """
+        lines = [(group_index, f'- ({sample["score"]}★, {sample["thumbs_up"]} likes'
+                               f'{self.format_duplicates(sample.get("duplicates", 1))}) ', sample['content'])
+                 for group_index, group in enumerate(groups) for sample in group]
+        if not lines:
+            return ['' for _ in groups]
+
+        # 每行的前缀、引号和换行也计入预算
+        text_budget = budget - sum(estimate_tokens(prefix) + 1 for _, prefix, _ in lines)
+        demands = [estimate_tokens(' '.join(str(content).split())) for _, _, content in lines]
+        allocation = allocate_token_budget(demands, max(text_budget, 0))
+
+        formatted = [[] for _ in groups]
+        for (group_index, prefix, content), demand, tokens in zip(lines, demands, allocation):
+            max_tokens = max(tokens, MIN_SAMPLE_TOKENS)
+            text = truncate_to_tokens(content, max_tokens)
+            # 按估算值判断是否截断，原文本身以省略号结尾的评论不会被误计
+            if demand > max_tokens:
+                self.count_metric('truncated_samples')
+            formatted[group_index].append(f'{prefix}"{text}"')
+
+        return ['\n'.join(group_lines) for group_lines in formatted]
+
+    @staticmethod
+    def format_duplicates(duplicates):
+        return f', posted {duplicates}x by different users' if duplicates > 1 else ''
+
+    def render_gemini_prompt(self, research_data, negative_samples, positive_samples):
+        return f"""You are a professor of marketing research. Analyze the Google Play reviews and generate 3-5 sentences focusing on bugs and product feedbacks.
 
 IMPORTANT: You MUST quote specific user reviews as examples to support your analysis. Use actual quotes from the reviews provided below.
 
@@ -470,180 +3003,404 @@ Analysis Mode: {research_data['analysis_mode']}
 Last Update: {research_data['last_update_date']}
 Analysis Period: {research_data['period_description']}
 
-Statistics:
-- Total Reviews: {research_data['statistics']['total_reviews']}
-- Average Rating: {research_data['statistics']['average_rating']}/5.0
-- Positive: {research_data['statistics']['positive_percentage']}%
-- Negative: {research_data['statistics']['negative_percentage']}%
+Statistics:
+- Total Reviews: {research_data['statistics']['total_reviews']}
+- Average Rating: {research_data['statistics']['average_rating']}/5.0
+- Positive: {research_data['statistics']['positive_percentage']}%
+- Negative: {research_data['statistics']['negative_percentage']}%
+{self.format_duplicate_prompt(research_data['statistics'])}
+Top Keywords: {', '.join(list(research_data['top_keywords'].keys())[:10])}
+{self.format_locale_prompt(research_data['locale_breakdown'])}
+Sample Negative Reviews (focus on bugs/issues):
+{negative_samples}
+
+Sample Positive Reviews (focus on features users like):
+{positive_samples}
+
+Output Requirements:
+1. Write in Chinese (中文)
+2. Generate 3-5 sentences
+3. Focus on: main bugs, feature requests, and product feedback trends
+4. MUST include at least 2 direct quotes from actual user reviews above as examples
+5. Format quotes like: 用户反馈："[actual quote from review]"
+
+Example format:
+用户对广告问题表达强烈不满。有评论指出："Too many ads, can't even play the game"，反映出广告频率过高影响了核心体验。另一位用户提到："Game crashes every time I open it"，表明存在严重的稳定性问题。"""
+
+    def format_duplicate_prompt(self, statistics):
+        """
+        合并了近似重复评论时在prompt中说明，否则为空
+        """
+        if not statistics['duplicate_reviews']:
+            return ''
+        return (f"- Near-duplicate reviews (spam/copy-paste) collapsed: {statistics['duplicate_reviews']} "
+                f"into {statistics['duplicate_groups']} groups\n")
+
+    def format_locale_prompt(self, breakdown):
+        """
+        多个地区时在prompt中附上各地区的统计，单一地区时为空
+        """
+        if len(breakdown) <= 1:
+            return ''
+
+        lines = ["\nBy Locale (reviews / average rating / negative %):"]
+        for locale, stats in breakdown.items():
+            lines.append(f"- {locale}: {stats['reviews']} / {stats['average_rating']} / "
+                         f"{stats['negative_percentage']}%")
+        return '\n'.join(lines) + '\n'
+
+    def stream_gemini_response(self, model, prompt, deadline, writer):
+        """
+        以流式方式生成并把每一块写入writer，返回完整文本
+        生成在守护线程中进行，当前线程最多等到deadline（time.monotonic()时刻），
+        连接卡住时也能按时抛出GeminiTimeoutError；首块到达的耗时记为gemini_first_token延迟
+        """
+        if time.monotonic() >= deadline:
+            raise GeminiTimeoutError(f"超过{self.gemini_timeout}秒时限")
+
+        chunks = queue.Queue()
+        finished = object()
+
+        def generate():
+            try:
+                response = model.generate_content(prompt, stream=True,
+                                                  request_options={'timeout': max(deadline - time.monotonic(), 1)})
+                for chunk in response:
+                    chunks.put(chunk.text)
+                chunks.put(finished)
+            except Exception as e:
+                chunks.put(e)
+
+        start = time.perf_counter()
+        threading.Thread(target=generate, name=f"gemini-{self.app_id}", daemon=True).start()
+        writer.restart()
+        parts = []
+
+        while True:
+            try:
+                chunk = chunks.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise GeminiTimeoutError(f"超过{self.gemini_timeout}秒时限") from None
+            if chunk is finished:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+
+            if not parts:
+                first_token = time.perf_counter() - start
+                self.record_latency('gemini_first_token', first_token)
+                print(f"✓ Gemini首个响应块用时{first_token:.1f}秒")
+            parts.append(chunk)
+            writer.write(chunk)
 
-Top Keywords: {', '.join(list(research_data['top_keywords'].keys())[:10])}
+        return ''.join(parts)
 
-Sample Negative Reviews (focus on bugs/issues):
-{json.dumps(research_data['sample_reviews']['negative'], ensure_ascii=False, indent=2)}
+    @timed_stage('gemini')
+    def call_gemini_api(self, research_data, output_file=None):
+        """
+        调用Gemini API生成Newsletter的AI分析部分
+        流式接收并逐块写入Newsletter文件；超过gemini_timeout秒仍未完成时返回None，
+        随后生成的是不含AI分析的Newsletter
+        """
+        if not self.gemini_api_key:
+            print("❌ 未配置Gemini API Key")
+            return None
 
-Sample Positive Reviews (focus on features users like):
-{json.dumps(research_data['sample_reviews']['positive'], ensure_ascii=False, indent=2)}
+        prompt = self.build_gemini_prompt(research_data)
+        prompt_tokens = estimate_tokens(prompt)
+        self.count_metric('prompt_chars', len(prompt))
+        self.count_metric('prompt_tokens', prompt_tokens)
+        print(f"Prompt约{prompt_tokens} tokens（预算{self.prompt_token_budget}）")
 
-Output Requirements:
-1. Write in Chinese (中文)
-2. Generate 3-5 sentences
-3. Focus on: main bugs, feature requests, and product feedback trends
-4. MUST include at least 2 direct quotes from actual user reviews above as examples
-5. Format quotes like: 用户反馈："[actual quote from review]"
+        # 相同模型和prompt的结果已缓存时跳过API调用
+        if self.gemini_cache is not None:
+            cached_text = self.gemini_cache.get(GEMINI_MODEL, prompt)
+            if cached_text:
+                self.count_metric('gemini_cache_hits')
+                print("✓ 命中Gemini缓存，跳过API调用")
+                return cached_text
 
-Example format:
-用户对广告问题表达强烈不满。有评论指出："Too many ads, can't even play the game"，反映出广告频率过高影响了核心体验。另一位用户提到："Game crashes every time I open it"，表明存在严重的稳定性问题。"""
+        newsletter_data, output_file = self.build_newsletter_data(research_data, output_file=output_file)
+        # 时限覆盖全部重试
+        deadline = time.monotonic() + self.gemini_timeout
 
-            # 调用API
-            response = model.generate_content(prompt)
+        try:
+            # 配置Gemini，使用Gemini 2.5 Flash（最新且快速的模型）
+            model = create_gemini_model(self.gemini_api_key)
+            print(f"✓ 使用模型: gemini-2.5-flash")
 
-            if response and response.text:
+            # 调用API
+            self.count_metric('gemini_requests')
+            with ProgressiveNewsletter(output_file, newsletter_header(newsletter_data) + AI_SECTION_TITLE) as writer:
+                text = self.call_with_retry("调用Gemini", self.stream_gemini_response, model, prompt, deadline,
+                                            writer, is_fatal=is_fatal_gemini_error, shared=False,
+                                            deadline=deadline)
+
+            if text:
+                self.count_metric('response_chars', len(text))
                 print("✓ Gemini AI分析完成")
-                return response.text
+                if self.gemini_cache is not None:
+                    self.gemini_cache.put(GEMINI_MODEL, prompt, text)
+                return text
             else:
                 print("❌ Gemini返回空响应")
                 return None
 
+        except GeminiTimeoutError as e:
+            self.count_metric('gemini_timeouts')
+            print(f"⚠️  Gemini生成{e}，改为生成不含AI分析的Newsletter")
+            return None
+
         except Exception as e:
             print(f"❌ Gemini API调用出错: {e}")
             return None
 
-    def generate_strategic_newsletter(self, analysis, df, output_file=None):
+    def generate_strategic_newsletter(self, analysis, review_analysis, output_file=None):
         """
         使用Gemini API生成战略性Newsletter（精简版，聚焦bug和产品反馈）
         """
-        if output_file is None:
-            safe_app_id = self.app_id.replace('.', '_')
-            timestamp = datetime.now().strftime('%Y%m%d')
-            output_file = f'{safe_app_id}_newsletter_{timestamp}.md'
-
         print("\n正在使用Gemini AI生成专业分析报告...")
 
         # 准备给Gemini的数据摘要
-        research_data = self.prepare_research_data(analysis, df)
+        research_data = self.prepare_research_data(analysis, review_analysis)
 
         # 调用Gemini API生成分析
-        gemini_analysis = self.call_gemini_api(research_data)
+        gemini_analysis = self.call_gemini_api(research_data, output_file)
 
-        # 构建完整Newsletter
-        newsletter = []
+        return self.write_newsletter(research_data, gemini_analysis, output_file)
+
+    def build_newsletter_data(self, research_data, gemini_analysis=None, output_file=None):
+        """
+        Newsletter所需的汇总数据（只含基础类型，不含评论列表），返回 (newsletter_data, output_file)
+        """
+        if output_file is None:
+            safe_app_id = self.app_id.replace('.', '_')
+            timestamp = datetime.now().strftime('%Y%m%d')
+            output_file = f'{safe_app_id}_newsletter_{timestamp}.md'
 
-        # 邮件主题
         update_date = self.last_update_date.strftime(
             '%Y年%m月%d日') if self.last_update_date else datetime.now().strftime('%Y年%m月%d日')
-        app_name = self.app_info['title']
-        mode_label = "最近100条" if self.analysis_mode == 'recent' else "更新后"
-        newsletter.append(f"**邮件主题:** Google Play 舆情监控（{mode_label}）：{update_date} - {app_name}\n")
-        newsletter.append("---\n\n")
-
-        if gemini_analysis:
-            # 使用Gemini生成的分析
-            newsletter.append("## AI 分析报告\n\n")
-            newsletter.append(gemini_analysis)
-            newsletter.append("\n\n---\n\n")
-
-        # 添加数据摘要
-        newsletter.append("## 数据摘要\n\n")
-        newsletter.append(f"**分析模式:** {research_data['analysis_mode']}\n")
-        if self.analysis_mode != 'recent':
-            newsletter.append(f"**分析周期:** 更新后 {research_data['analysis_period_days']} 天\n")
-        newsletter.append(f"**总评论数:** {research_data['statistics']['total_reviews']}\n")
-        newsletter.append(f"**平均评分:** {research_data['statistics']['average_rating']}/5.0\n")
-        newsletter.append(f"**情感分布:** 正面 {research_data['statistics']['positive_percentage']}% | ")
-        newsletter.append(f"中性 {research_data['statistics']['neutral_percentage']}% | ")
-        newsletter.append(f"负面 {research_data['statistics']['negative_percentage']}%\n\n")
-
-        # 高频关键词
-        newsletter.append("**高频关键词:**\n")
-        for keyword, count in list(research_data['top_keywords'].items())[:10]:
-            newsletter.append(f"- {keyword}: {count}次\n")
-
-        newsletter.append("\n---\n\n")
-        newsletter.append("如有问题或建议请随时联系。\n")
-
-        # 写入文件
-        newsletter_text = "".join(newsletter)
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(newsletter_text)
 
+        newsletter_data = {
+            'app_name': self.app_info['title'],
+            'update_date': update_date,
+            'mode_label': f"最近{self.recent_count}条" if self.analysis_mode == 'recent' else "更新后",
+            'analysis_mode': research_data['analysis_mode'],
+            'analysis_period_days': research_data['analysis_period_days'],
+            'statistics': research_data['statistics'],
+            'top_keywords': research_data['top_keywords'],
+            'locale_breakdown': research_data['locale_breakdown'],
+            'gemini_analysis': gemini_analysis,
+        }
+
+        return newsletter_data, output_file
+
+    @timed_stage('newsletter')
+    def write_newsletter(self, research_data, gemini_analysis=None, output_file=None):
+        """
+        根据研究数据和（可选的）AI分析组装Newsletter并写入文件
+        """
+        newsletter_data, output_file = self.build_newsletter_data(research_data, gemini_analysis, output_file)
+        newsletter_text = render_newsletter(newsletter_data, output_file)
+        self.report_newsletter(output_file)
+
+        return newsletter_text, output_file
+
+    def report_newsletter(self, output_file):
         # 获取完整路径
         full_path = os.path.abspath(output_file)
         print(f"\n✓ Newsletter已保存至:")
         print(f"   {full_path}")
 
-        return newsletter_text, output_file
+    def build_chart_data(self):
+        """
+        图表所需的全部聚合数据（只含少量基础类型，与评论条数无关）
+        """
+        review_analysis = self.review_analysis
+        daily = review_analysis.daily
+
+        return {
+            'title': self.app_info['title'],
+            'rating_counts': {int(k): int(v) for k, v in review_analysis.rating_counts.items()},
+            'dates': [day.strftime('%Y-%m-%d') for day in daily.index],
+            'daily_counts': [int(v) for v in daily['count']],
+            'daily_avg': [round(float(v), 4) for v in daily['mean']],
+            'sentiment_counts': {str(k): int(v) for k, v in review_analysis.sentiment_counts.items()},
+        }
 
-    def create_visualizations(self, output_file=None):
+    def plan_visualization(self, output_file=None):
         """
-        创建可视化图表
+        准备图表渲染任务（只含基础类型，可发送给子进程），没有评论数据时返回None
+        聚合数据与上次渲染时完全相同且图表文件仍在时，任务标记为skip
         """
+        chart_format = self.chart_format
+        extension, default_dpi = CHART_FORMATS[chart_format]
+        dpi = self.chart_dpi or default_dpi
+
         if output_file is None:
             safe_app_id = self.app_id.replace('.', '_')
-            output_file = f'{safe_app_id}_charts.png'
+            output_file = f'{safe_app_id}_charts.{extension}'
 
-        if not self.reviews_data:
-            print("没有可用的评论数据。")
-            return None
+        if self.review_analysis is None:
+            if not self.reviews_data:
+                print("没有可用的评论数据。")
+                return None
+            self.review_analysis = ReviewAnalysis(self.reviews_data, self.keyword_extractor,
+                                                  self.duplicate_detector)
+
+        chart_data = self.build_chart_data()
+        chart_hash = chart_data_hash(chart_data, chart_format, dpi)
+        hash_file = f'{output_file}.sha256'
+
+        skip = False
+        if not self.force_render and os.path.exists(output_file) and os.path.exists(hash_file):
+            with open(hash_file, 'r', encoding='utf-8') as f:
+                skip = f.read().strip() == chart_hash
+
+        return {
+            'chart_data': chart_data,
+            'output_file': output_file,
+            'chart_format': chart_format,
+            'dpi': dpi,
+            'hash': chart_hash,
+            'skip': skip,
+        }
 
-        df = pd.DataFrame(self.reviews_data)
-        df['date'] = pd.to_datetime(df['at']).dt.date
-
-        fig, axes = plt.subplots(2, 2, figsize=(15, 10))
-        fig.suptitle(f'评论分析: {self.app_info["title"]}', fontsize=16, fontweight='bold')
-
-        # 1. 评分分布
-        rating_counts = df['score'].value_counts().sort_index()
-        axes[0, 0].bar(rating_counts.index, rating_counts.values, color='skyblue', edgecolor='navy')
-        axes[0, 0].set_title('评分分布', fontsize=12, fontweight='bold')
-        axes[0, 0].set_xlabel('评分')
-        axes[0, 0].set_ylabel('数量')
-        axes[0, 0].set_xticks([1, 2, 3, 4, 5])
-        axes[0, 0].grid(axis='y', alpha=0.3)
-
-        # 2. 每日评论量趋势
-        daily_counts = df.groupby('date').size()
-        axes[0, 1].plot(daily_counts.index, daily_counts.values, marker='o', color='green', linewidth=2)
-        axes[0, 1].fill_between(daily_counts.index, daily_counts.values, alpha=0.3, color='green')
-        axes[0, 1].set_title('每日评论量', fontsize=12, fontweight='bold')
-        axes[0, 1].set_xlabel('日期')
-        axes[0, 1].set_ylabel('评论数')
-        axes[0, 1].tick_params(axis='x', rotation=45)
-        axes[0, 1].grid(alpha=0.3)
-
-        # 3. 每日平均评分趋势
-        daily_avg = df.groupby('date')['score'].mean()
-        axes[1, 0].plot(daily_avg.index, daily_avg.values, marker='o', color='orange', linewidth=2)
-        axes[1, 0].set_title('每日平均评分', fontsize=12, fontweight='bold')
-        axes[1, 0].set_xlabel('日期')
-        axes[1, 0].set_ylabel('平均评分')
-        axes[1, 0].set_ylim([0, 5])
-        axes[1, 0].axhline(y=3.5, color='r', linestyle='--', label='3.5阈值', linewidth=2)
-        axes[1, 0].legend()
-        axes[1, 0].tick_params(axis='x', rotation=45)
-        axes[1, 0].grid(alpha=0.3)
-
-        # 4. 情感饼图
-        df['sentiment'] = df['score'].apply(lambda x:
-                                            '正面' if x >= 4 else ('中性' if x == 3 else '负面'))
-        sentiment_counts = df['sentiment'].value_counts()
-        colors = {'正面': 'lightgreen', '中性': 'yellow', '负面': 'lightcoral'}
-        axes[1, 1].pie(sentiment_counts.values, labels=sentiment_counts.index, autopct='%1.1f%%',
-                       colors=[colors.get(x, 'gray') for x in sentiment_counts.index],
-                       startangle=90, textprops={'fontsize': 11})
-        axes[1, 1].set_title('情感分布', fontsize=12, fontweight='bold')
+    def finish_visualization(self, chart_task):
+        """
+        图表渲染完成后记录数据哈希并输出路径
+        """
+        output_file = chart_task['output_file']
+
+        if chart_task['skip']:
+            self.count_metric('charts_skipped')
+            print(f"✓ 图表数据未变化，跳过渲染: {output_file}")
+            return output_file
 
-        plt.tight_layout()
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
+        with open(f'{output_file}.sha256', 'w', encoding='utf-8') as f:
+            f.write(chart_task['hash'])
 
         # 获取完整路径
         full_path = os.path.abspath(output_file)
         print(f"✓ 可视化图表已保存至:")
         print(f"   {full_path}")
 
-        plt.close()
-
         return output_file
 
+    @timed_stage('charts')
+    def create_visualizations(self, output_file=None):
+        """
+        创建可视化图表
+        输出格式由chart_format决定；聚合数据与上次相同时跳过渲染
+        """
+        chart_task = self.plan_visualization(output_file)
+        if chart_task is None:
+            return None
+
+        if not chart_task['skip']:
+            render_charts(chart_task['chart_data'], chart_task['output_file'],
+                          chart_task['chart_format'], chart_task['dpi'])
+
+        return self.finish_visualization(chart_task)
+
+    def uses_rollups(self):
+        """
+        使用本地库且不需要评论列表（非流式、不保存快照、不合并近似重复评论）时，统计直接来自按天汇总表
+        """
+        return (self.store is not None and not self.streaming and self.snapshot_dir is None
+                and self.duplicate_detector is None)
+
+    def snapshot_path(self):
+        return os.path.join(self.snapshot_dir, self.app_id.replace('.', '_'))
+
+    @timed_stage('save_snapshot')
+    def save_snapshot(self):
+        """
+        把当前评论保存为列式快照
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        meta = {
+            'app_id': self.app_id,
+            'app_info': {field: self.app_info.get(field) for field in MetadataCache.FIELDS},
+            'last_update_date': self.last_update_date.isoformat() if self.last_update_date else None,
+            'analysis_mode': self.analysis_mode,
+            'recent_count': self.recent_count,
+            'locales': [locale_key(lang, country) for lang, country in self.locales],
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        ReviewSnapshot.write(self.snapshot_path(), self.reviews_data, meta)
+        print(f"✓ 评论快照已保存至: {os.path.abspath(self.snapshot_path())}")
+
+    @timed_stage('load_snapshot')
+    def load_snapshot(self):
+        """
+        从快照恢复应用信息和评论（数值列内存映射读取），成功返回True
+        分析模式沿用快照获取时的设置，保证报告中的分析周期与数据一致
+        """
+        path = self.snapshot_path()
+        if not os.path.exists(os.path.join(path, ReviewSnapshot.META_FILE)):
+            print(f"❌ 未找到评论快照: {path}")
+            return False
+
+        snapshot = ReviewSnapshot(path)
+        meta = snapshot.meta
+        self.app_info = meta['app_info']
+        self.last_update_date = (datetime.fromisoformat(meta['last_update_date'])
+                                 if meta['last_update_date'] else None)
+        self.analysis_mode = meta['analysis_mode']
+        self.recent_count = meta['recent_count']
+        self.reviews_data = snapshot
+        self.count_metric('reviews', len(snapshot))
+
+        print(f"应用名称: {self.app_info['title']}")
+        print(f"✓ 从快照加载{len(snapshot)}条评论（保存于 {meta['saved_at']}）")
+
+        return True
+
+    def fetch_reviews_for_analysis(self, min_days=7, max_days=30):
+        """
+        分析的网络I/O部分：获取最后更新日期、检查更新阈值并拉取评论
+        返回: 'proceed' 表示可以继续分析，否则为最终状态 ('too_recent', 'too_old', 'no_reviews', 'error')
+        """
+        # 从快照重新分析时跳过网络和更新阈值检查
+        if self.from_snapshot:
+            if not self.load_snapshot():
+                return 'error'
+            return 'proceed' if len(self.reviews_data) else 'no_reviews'
+
+        # 步骤1: 获取最后更新日期
+        if not self.get_last_update_date():
+            print("❌ 获取应用信息失败")
+            return 'error'
+
+        # 步骤2: 检查更新是否在可接受范围内
+        status = self.check_update_threshold(min_days, max_days)
+
+        if status != 'proceed':
+            return status
+
+        # 步骤3: 获取更新后的评论
+        if self.streaming:
+            self.stream_reviews_since_update()
+            has_reviews = self.review_analysis is not None and self.review_analysis.total_reviews > 0
+        elif self.uses_rollups():
+            has_reviews = self.sync_store_reviews() > 0
+        else:
+            self.get_reviews_since_update()
+            has_reviews = bool(self.reviews_data)
+
+        if not has_reviews:
+            print("\n⚠️  在指定期间内未找到评论。")
+            return 'no_reviews'
+
+        if self.snapshot_dir is not None:
+            if self.streaming:
+                print("⚠️  流式模式不保留评论列表，未保存快照")
+            else:
+                self.save_snapshot()
+
+        return 'proceed'
+
     def run_full_analysis(self, min_days=7, max_days=30):
         """
         运行完整分析流程
@@ -654,32 +3411,20 @@ Example format:
         print("=" * 80)
 
         try:
-            # 步骤1: 获取最后更新日期
-            if not self.get_last_update_date():
-                print("❌ 获取应用信息失败")
-                return 'error'
-
-            # 步骤2: 检查更新是否在可接受范围内
-            status = self.check_update_threshold(min_days, max_days)
+            # 步骤1-3: 获取应用信息、检查更新时间、获取评论
+            status = self.fetch_reviews_for_analysis(min_days, max_days)
 
             if status != 'proceed':
                 return status
 
-            # 步骤3: 获取更新后的评论
-            self.get_reviews_since_update()
-
-            if not self.reviews_data or len(self.reviews_data) == 0:
-                print("\n⚠️  在指定期间内未找到评论。")
-                return 'no_reviews'
-
             # 步骤4: 分析评论
-            analysis, df = self.analyze_reviews()
+            analysis, review_analysis = self.analyze_reviews()
 
             if not analysis:
                 return 'error'
 
             # 步骤5: 生成Newsletter
-            newsletter_text, newsletter_file = self.generate_strategic_newsletter(analysis, df)
+            newsletter_text, newsletter_file = self.generate_strategic_newsletter(analysis, review_analysis)
             print(f"📄 Newsletter: {newsletter_file}")
 
             # 步骤6: 生成可视化
@@ -696,16 +3441,419 @@ Example format:
             return 'error'
 
 
+# 组合分析中比较排名变化的周期天数：最近N天与之前N天的平均评分排名
+PORTFOLIO_PERIOD_DAYS = 7
+
+# 每日汇总中各情感条数的列名，与SENTIMENT_LABELS一一对应
+SENTIMENT_COLUMNS = ['negative', 'neutral', 'positive']
+
+
+class PortfolioAnalysis:
+    """
+    多应用组合分析：把各应用的每日汇总合并成一个带app_id列的DataFrame（每个应用每天一行），
+    各应用的统计、情感构成、每日趋势和排名变化都在这一个DataFrame上用分组运算算出，
+    不需要重新加载任何应用的评论
+
+    参数:
+        daily_stats: {app_id: 每日汇总}，即各分析类的daily（mean、count及各情感条数）
+        app_names: {app_id: 应用名称}，用于表格和图表中的显示
+        period_days: 比较排名变化的周期天数
+    """
+
+    def __init__(self, daily_stats, app_names=None, period_days=PORTFOLIO_PERIOD_DAYS):
+        import pandas as pd
+
+        self.app_names = app_names or {}
+        self.period_days = period_days
+
+        frame = pd.concat([stats.assign(app_id=app_id) for app_id, stats in daily_stats.items()])
+        frame = frame.rename_axis('date').reset_index()
+        frame['date'] = pd.to_datetime(frame['date'])
+        frame['app_id'] = pd.Categorical(frame['app_id'], categories=list(daily_stats))
+        frame['score_sum'] = frame['mean'] * frame['count']
+        # 按距组合中最新一天的天数划分周期：0为本期，1为上期
+        self.latest_day = frame['date'].max()
+        frame['period'] = (self.latest_day - frame['date']).dt.days // period_days
+        self.frame = frame
+
+        # 各应用的评论数、平均分和情感构成（一次分组）
+        stats = frame.groupby('app_id', observed=True).agg(
+            reviews=('count', 'sum'), score_sum=('score_sum', 'sum'), negative=('negative', 'sum'),
+            neutral=('neutral', 'sum'), positive=('positive', 'sum'), first_day=('date', 'min'),
+            last_day=('date', 'max'))
+        stats['average_rating'] = stats['score_sum'] / stats['reviews']
+        for column in SENTIMENT_COLUMNS:
+            stats[f'{column}_percentage'] = stats[column] / stats['reviews'] * 100
+        stats['rank'] = stats['average_rating'].rank(ascending=False, method='min')
+
+        # 本期和上期的平均评分（一次分组），再在两期内分别排名；正数的rank_change表示排名上升
+        periods = frame[frame['period'] <= 1].groupby(['app_id', 'period'], observed=True)[
+            ['score_sum', 'count']].sum()
+        period_rating = (periods['score_sum'] / periods['count']).unstack().reindex(columns=[0, 1])
+        period_rank = period_rating.rank(ascending=False, method='min')
+        stats['current_rating'] = period_rating[0]
+        stats['previous_rating'] = period_rating[1]
+        stats['current_rank'] = period_rank[0]
+        stats['previous_rank'] = period_rank[1]
+        stats['rank_change'] = stats['previous_rank'] - stats['current_rank']
+
+        self.stats = stats.sort_values(['rank', 'reviews'], ascending=[True, False])
+
+        # 每日趋势：日期 × 应用；没有评论的日期评论数为0、平均分留空
+        self.daily_avg = frame.pivot(index='date', columns='app_id', values='mean')
+        self.daily_counts = frame.pivot(index='date', columns='app_id', values='count').fillna(0).astype('int64')
+
+    def label(self, app_id):
+        name = self.app_names.get(app_id)
+        return name if name and name != '未知' else app_id
+
+    def write_table(self, output_file):
+        """
+        写出Markdown格式的组合分析表格，按平均评分排名
+        """
+        import pandas as pd
+
+        def rating(value):
+            return '-' if pd.isna(value) else f"{value:.2f}"
+
+        def rank_change(row):
+            if pd.isna(row.current_rank):
+                return '-'
+            if pd.isna(row.previous_rank):
+                return '新'
+            change = int(row.rank_change)
+            return f"↑{change}" if change > 0 else (f"↓{-change}" if change < 0 else '持平')
+
+        days = self.period_days
+        lines = [
+            "# 应用组合分析\n\n",
+            f"**分析日期:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"**应用数:** {len(self.stats)}\n",
+            f"**总评论数:** {int(self.stats['reviews'].sum())}\n",
+            f"**排名变化:** 按平均评分排名，最近{days}天（截至 {self.latest_day.strftime('%Y-%m-%d')}）"
+            f"对比之前{days}天\n\n",
+            f"| 排名 | 应用 | 评论数 | 平均评分 | 正面 | 中性 | 负面 | 最近{days}天评分 | 之前{days}天评分 | 排名变化 |\n",
+            "|------|------|--------|----------|------|------|------|------|------|------|\n",
+        ]
+        for row in self.stats.itertuples():
+            lines.append(
+                f"| {int(row.rank)} | {self.label(row.Index)} ({row.Index}) | {int(row.reviews)} | "
+                f"{rating(row.average_rating)} | {row.positive_percentage:.1f}% | {row.neutral_percentage:.1f}% | "
+                f"{row.negative_percentage:.1f}% | {rating(row.current_rating)} | {rating(row.previous_rating)} | "
+                f"{rank_change(row)} |\n"
+            )
+
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write("".join(lines))
+
+        return output_file
+
+    def render_chart(self, output_file, chart_format='png', dpi=None):
+        """
+        渲染组合图表（平均评分、情感构成、每日平均评分、每日评论量）；
+        html格式不依赖matplotlib，输出带情感构成条的网页表格
+        """
+        if chart_format == 'html':
+            return self.render_html(output_file)
+
+        stats = self.stats
+        labels = [self.label(app_id) for app_id in stats.index]
+        positions = list(range(len(labels)))
+
+        fig = new_figure(figsize=(15, max(10, len(labels) * 0.4)))
+        axes = fig.subplots(2, 2)
+        fig.suptitle(f'应用组合分析: {len(labels)}个应用', fontsize=16, fontweight='bold')
+
+        # 1. 平均评分排名
+        axes[0, 0].barh(positions, stats['average_rating'], color='skyblue', edgecolor='navy')
+        axes[0, 0].set_yticks(positions)
+        axes[0, 0].set_yticklabels(labels)
+        axes[0, 0].invert_yaxis()
+        axes[0, 0].set_xlim([0, 5])
+        axes[0, 0].axvline(x=3.5, color='r', linestyle='--', linewidth=2)
+        axes[0, 0].set_title('平均评分', fontsize=12, fontweight='bold')
+        axes[0, 0].grid(axis='x', alpha=0.3)
+
+        # 2. 情感构成（堆叠条形）
+        left = [0.0] * len(labels)
+        for sentiment, column in zip(SENTIMENT_LABELS, SENTIMENT_COLUMNS):
+            values = stats[f'{column}_percentage'].tolist()
+            axes[0, 1].barh(positions, values, left=left, color=SENTIMENT_COLORS[sentiment], label=sentiment)
+            left = [start + value for start, value in zip(left, values)]
+        axes[0, 1].set_yticks(positions)
+        axes[0, 1].set_yticklabels(labels)
+        axes[0, 1].invert_yaxis()
+        axes[0, 1].set_xlim([0, 100])
+        axes[0, 1].set_xlabel('%')
+        axes[0, 1].set_title('情感构成', fontsize=12, fontweight='bold')
+        axes[0, 1].legend(loc='lower right')
+
+        # 3-4. 每日趋势，每个应用一条线
+        for ax, trends, title, ylabel in ((axes[1, 0], self.daily_avg, '每日平均评分', '平均评分'),
+                                          (axes[1, 1], self.daily_counts, '每日评论量', '评论数')):
+            for app_id, label in zip(stats.index, labels):
+                series = trends[app_id].dropna()
+                ax.plot(series.index, series.values, marker='o', markersize=3, linewidth=1.5, label=label)
+            ax.set_title(title, fontsize=12, fontweight='bold')
+            ax.set_xlabel('日期')
+            ax.set_ylabel(ylabel)
+            ax.tick_params(axis='x', rotation=45)
+            ax.grid(alpha=0.3)
+        axes[1, 0].set_ylim([0, 5])
+        if len(labels) <= 10:
+            axes[1, 0].legend(fontsize=8)
+
+        fig.tight_layout()
+        fig.savefig(output_file, dpi=dpi, bbox_inches='tight')
+
+        return output_file
+
+    def render_html(self, output_file):
+        rows = []
+        for row in self.stats.itertuples():
+            bar = ''.join(
+                f'<span style="display:inline-block;width:{getattr(row, f"{column}_percentage") * 2:.1f}px;'
+                f'height:12px;background:{SENTIMENT_COLORS[sentiment]}" title="{sentiment}: '
+                f'{getattr(row, f"{column}_percentage"):.1f}%"></span>'
+                for sentiment, column in zip(SENTIMENT_LABELS, SENTIMENT_COLUMNS)
+            )
+            rows.append(f'<tr><td>{int(row.rank)}</td><td>{html.escape(str(self.label(row.Index)))}</td>'
+                        f'<td>{int(row.reviews)}</td><td>{row.average_rating:.2f}</td><td>{bar}</td></tr>')
+
+        document = (
+            '<!DOCTYPE html><html><head><meta charset="utf-8"><title>应用组合分析</title>'
+            '<style>body{font-family:sans-serif}td,th{padding:4px 8px;text-align:left}</style></head><body>'
+            f'<h2>应用组合分析: {len(rows)}个应用</h2>'
+            '<table><tr><th>排名</th><th>应用</th><th>评论数</th><th>平均评分</th><th>情感构成</th></tr>'
+            f'{"".join(rows)}</table></body></html>'
+        )
+
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(document)
+
+        return output_file
+
+
+class PipelineJob:
+    """
+    流水线中单个应用的处理状态，在各阶段之间传递
+    """
+
+    def __init__(self, index, app_id, monitor):
+        self.index = index
+        self.app_id = app_id
+        self.monitor = monitor
+        self.status = None
+        self.analysis = None
+        self.review_analysis = None
+        self.research_data = None
+        self.gemini_analysis = None
+
+
+class AnalysisPipeline:
+    """
+    分阶段的批量分析流水线：抓取 → 分析 → LLM → 渲染
+    每个阶段有独立的工作线程数，阶段之间用有界队列连接；
+    下游处理不过来时上游会阻塞在put上（背压），同时在途的应用数量因此有上限
+    """
+
+    STAGES = ('fetch', 'analyze', 'llm', 'render')
+
+    def __init__(self, monitor_factory, min_days=7, max_days=30, stage_workers=None,
+                 queue_size=DEFAULT_PIPELINE_QUEUE_SIZE, render_executor=None):
+        """
+        参数:
+            monitor_factory: 根据app_id创建PlayStoreMonitor的函数
+            stage_workers: 各阶段并发数，如 {'fetch': 8, 'analyze': 2, 'llm': 2, 'render': 2}
+            queue_size: 阶段间队列的最大长度
+            render_executor: 可选的进程池；提供时图表和Newsletter在子进程中渲染，
+                             只向子进程发送汇总数据，不占用主进程的GIL
+        """
+        self.monitor_factory = monitor_factory
+        self.min_days = min_days
+        self.max_days = max_days
+        self.stage_workers = dict(DEFAULT_STAGE_WORKERS, **(stage_workers or {}))
+        self.queue_size = queue_size
+        self.render_executor = render_executor
+        self._finished = {}
+        self._lock = threading.Lock()
+
+    def run(self, app_ids):
+        """
+        处理所有应用，返回按输入顺序排列的 [(app_id, monitor, status), ...]
+        """
+        self._finished = {}
+        inputs = queue.Queue()
+        for index, app_id in enumerate(app_ids, 1):
+            inputs.put((index, app_id))
+
+        # 每个阶段的输入队列；抓取阶段的输入已全部就绪，无需限长
+        queues = [inputs] + [queue.Queue(maxsize=self.queue_size) for _ in self.STAGES[1:]]
+        handlers = [self._fetch, self._analyze, self._call_llm, self._render]
+        total = len(app_ids)
+
+        for stage in self.STAGES:
+            print(f"   {stage}: {self.stage_workers[stage]}个并发")
+
+        stage_threads = []
+        for i, stage in enumerate(self.STAGES):
+            next_queue = queues[i + 1] if i + 1 < len(queues) else None
+            threads = [
+                threading.Thread(target=self._worker, args=(handlers[i], queues[i], next_queue, total),
+                                 name=f"{stage}-{n}", daemon=True)
+                for n in range(self.stage_workers[stage])
+            ]
+            for thread in threads:
+                thread.start()
+            stage_threads.append(threads)
+
+        # 逐个阶段收尾：上游全部结束后向下游发送结束标记
+        for _ in range(self.stage_workers['fetch']):
+            inputs.put(None)
+        for i, threads in enumerate(stage_threads):
+            for thread in threads:
+                thread.join()
+            if i + 1 < len(queues):
+                for _ in range(self.stage_workers[self.STAGES[i + 1]]):
+                    queues[i + 1].put(None)
+
+        return [self._finished[index] for index in range(1, total + 1)]
+
+    def _worker(self, handler, in_queue, out_queue, total):
+        while True:
+            item = in_queue.get()
+            if item is None:
+                break
+
+            try:
+                # 监控器在抓取线程中创建，创建失败同样记为该应用出错，不中断工作线程
+                if not isinstance(item, PipelineJob):
+                    item = self._create_job(item, total)
+                job = handler(item)
+            except Exception as e:
+                if not isinstance(item, PipelineJob):
+                    item = PipelineJob(item[0], item[1], None)
+                print(f"❌ 分析过程中出错: {e}")
+                traceback.print_exc()
+                item.status = 'error'
+                self._finish(item)
+                continue
+
+            if out_queue is None or job.status is not None:
+                self._finish(job)
+            else:
+                out_queue.put(job)
+
+    def _finish(self, job):
+        if job.status is None:
+            job.status = 'success'
+        # 释放评论和中间结果，只保留汇总需要的信息（监控器创建失败时monitor为None）
+        if job.monitor is not None:
+            job.monitor.reviews_data = None
+            job.monitor.review_analysis = None
+        job.analysis = job.review_analysis = job.research_data = job.gemini_analysis = None
+
+        with self._lock:
+            self._finished[job.index] = (job.app_id, job.monitor, job.status)
+
+    def _create_job(self, item, total):
+        index, app_id = item
+        print(f"\n\n[{index}/{total}] 正在处理: {app_id}")
+
+        return PipelineJob(index, app_id, self.monitor_factory(app_id))
+
+    def _fetch(self, job):
+        status = job.monitor.fetch_reviews_for_analysis(self.min_days, self.max_days)
+
+        if status != 'proceed':
+            job.status = status
+        return job
+
+    def _analyze(self, job):
+        job.analysis, job.review_analysis = job.monitor.analyze_reviews()
+        if not job.analysis:
+            job.status = 'error'
+            return job
+
+        job.research_data = job.monitor.prepare_research_data(job.analysis, job.review_analysis)
+        return job
+
+    def _call_llm(self, job):
+        job.gemini_analysis = job.monitor.call_gemini_api(job.research_data)
+        return job
+
+    def _render(self, job):
+        monitor = job.monitor
+
+        if self.render_executor is None:
+            newsletter_text, newsletter_file = monitor.write_newsletter(job.research_data, job.gemini_analysis)
+            viz_file = monitor.create_visualizations()
+        else:
+            newsletter_data, newsletter_file = monitor.build_newsletter_data(job.research_data,
+                                                                             job.gemini_analysis)
+            chart_task = monitor.plan_visualization()
+            # 渲染线程在等待结果时释放GIL，其他应用的抓取和分析继续进行
+            start = time.perf_counter()
+            self.render_executor.submit(render_outputs, newsletter_data, newsletter_file, chart_task).result()
+            monitor.record_stage_time('render_process', time.perf_counter() - start)
+            monitor.report_newsletter(newsletter_file)
+            viz_file = monitor.finish_visualization(chart_task) if chart_task else None
+
+        print(f"📄 Newsletter: {newsletter_file}")
+        if viz_file:
+            print(f"📊 图表: {viz_file}")
+
+        job.status = 'success'
+        return job
+
+
 class MultiAppMonitor:
     """
     监控多个应用
     """
 
-    def __init__(self, gemini_api_key=None, analysis_mode='update'):
+    def __init__(self, gemini_api_key=None, analysis_mode='update', recent_count=100, store=None,
+                 max_workers=1, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, metadata_cache=None,
+                 gemini_cache=None, stage_workers=None, queue_size=DEFAULT_PIPELINE_QUEUE_SIZE,
+                 keyword_extractor=None, streaming=False, rate_limiter=None, chart_format='png',
+                 chart_dpi=None, force_render=False, render_processes=0, snapshot_dir=None,
+                 from_snapshot=False, max_retries=DEFAULT_MAX_RETRIES, circuit_breaker=None, locales=None,
+                 prompt_token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, gemini_timeout=DEFAULT_GEMINI_TIMEOUT,
+                 duplicate_detector=None, portfolio=False):
         self.app_ids = []
         self.results = {}
         self.gemini_api_key = gemini_api_key
         self.analysis_mode = analysis_mode
+        self.recent_count = recent_count
+        self.store = store
+        self.max_workers = max_workers
+        # max_workers为抓取阶段的并发数，其余阶段可通过stage_workers单独设置
+        self.stage_workers = dict(stage_workers or {}, fetch=max_workers)
+        self.queue_size = queue_size
+        # 传入rate_limiter时与其他批次共享限速（常驻模式）
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_second)
+        # 重试策略和熔断器同样由本批次所有应用共享
+        self.retry_policy = RetryPolicy(max_retries)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.locales = locales
+        self.metadata_cache = metadata_cache
+        self.gemini_cache = gemini_cache
+        self.keyword_extractor = keyword_extractor
+        self.streaming = streaming
+        self.chart_format = chart_format
+        self.chart_dpi = chart_dpi
+        self.force_render = force_render
+        # 大于0时渲染阶段使用该大小的进程池，0表示在当前进程的渲染线程中渲染
+        self.render_processes = render_processes
+        self.snapshot_dir = snapshot_dir
+        self.from_snapshot = from_snapshot
+        self.prompt_token_budget = prompt_token_budget
+        self.gemini_timeout = gemini_timeout
+        self.duplicate_detector = duplicate_detector
+        # 为True时汇总报告之外再输出所有应用的组合分析表格和图表
+        self.portfolio = portfolio
+        self.batch_seconds = None
+        self.portfolio_seconds = None
 
     def prompt_for_apps(self):
         """
@@ -777,22 +3925,63 @@ class MultiAppMonitor:
         print(f"开始批量分析")
         print(f"最小更新天数: {min_days}")
         print(f"最大更新天数: {max_days}")
+        print(f"限速: {self.rate_limiter.rate}次/秒")
         print("=" * 80)
 
-        for i, app_id in enumerate(self.app_ids, 1):
-            print(f"\n\n[{i}/{len(self.app_ids)}] 正在处理: {app_id}")
-
-            monitor = PlayStoreMonitor(app_id, gemini_api_key=self.gemini_api_key, analysis_mode=self.analysis_mode)
-            status = monitor.run_full_analysis(min_days, max_days)
-
+        stage_workers = dict(self.stage_workers)
+        render_executor = None
+        if self.render_processes > 0:
+            print(f"渲染进程: {self.render_processes}个")
+            # 渲染进程在第一次提交时才创建，此时已有抓取、LLM等线程和SQLite连接、gRPC通道，
+            # fork出的子进程可能死锁；render_outputs只接收基础类型数据，因此用spawn启动干净的进程
+            render_executor = ProcessPoolExecutor(max_workers=self.render_processes,
+                                                  mp_context=multiprocessing.get_context('spawn'))
+            # 每个渲染线程同时最多等待一个任务，线程数不少于进程数才能让进程池满载
+            stage_workers['render'] = max(stage_workers.get('render', DEFAULT_STAGE_WORKERS['render']),
+                                          self.render_processes)
+
+        pipeline = AnalysisPipeline(self.create_monitor, min_days, max_days, stage_workers=stage_workers,
+                                    queue_size=self.queue_size, render_executor=render_executor)
+
+        start = time.perf_counter()
+        try:
+            finished = pipeline.run(self.app_ids)
+        finally:
+            if render_executor is not None:
+                render_executor.shutdown()
+        self.batch_seconds = time.perf_counter() - start
+
+        # 流水线按输入顺序返回结果，保证results和汇总报告的顺序与并发完成顺序无关
+        for app_id, monitor, status in finished:
+            if monitor is None:
+                self.results[app_id] = {'status': status, 'app_name': '未知', 'last_update': None,
+                                        'metrics': None, 'daily_stats': None}
+                continue
             self.results[app_id] = {
                 'status': status,
                 'app_name': monitor.app_info.get('title', '未知') if monitor.app_info else '未知',
-                'last_update': monitor.last_update_date
+                'last_update': monitor.last_update_date,
+                'metrics': monitor.metrics,
+                'daily_stats': monitor.daily_stats
             }
 
         self.generate_summary_report()
 
+    def create_monitor(self, app_id):
+        """
+        创建共享本批次限速器和缓存的单应用监控器
+        """
+        return PlayStoreMonitor(app_id, gemini_api_key=self.gemini_api_key, analysis_mode=self.analysis_mode,
+                                recent_count=self.recent_count, store=self.store,
+                                rate_limiter=self.rate_limiter, metadata_cache=self.metadata_cache,
+                                gemini_cache=self.gemini_cache, keyword_extractor=self.keyword_extractor,
+                                streaming=self.streaming, chart_format=self.chart_format,
+                                chart_dpi=self.chart_dpi, force_render=self.force_render,
+                                snapshot_dir=self.snapshot_dir, from_snapshot=self.from_snapshot,
+                                retry_policy=self.retry_policy, circuit_breaker=self.circuit_breaker,
+                                locales=self.locales, prompt_token_budget=self.prompt_token_budget,
+                                gemini_timeout=self.gemini_timeout, duplicate_detector=self.duplicate_detector)
+
     def generate_summary_report(self):
         """
         生成所有应用的汇总报告
@@ -837,14 +4026,21 @@ class MultiAppMonitor:
         for app in summary['error']:
             print(f"   • {app['name']} ({app['id']})")
 
+        if self.gemini_cache is not None:
+            print(f"\n🗄️  {self.gemini_cache.stats_line()}")
+
         # 保存汇总到文件
-        summary_file = f"batch_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        summary_file = f"batch_summary_{timestamp}.txt"
         with open(summary_file, 'w', encoding='utf-8') as f:
             f.write("=" * 80 + "\n")
             f.write("批量分析汇总\n")
             f.write("=" * 80 + "\n")
             f.write(f"分析日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"应用总数: {len(self.results)}\n\n")
+            f.write(f"应用总数: {len(self.results)}\n")
+            if self.gemini_cache is not None:
+                f.write(f"{self.gemini_cache.stats_line()}\n")
+            f.write("\n")
 
             for status, apps in summary.items():
                 status_name = {
@@ -864,15 +4060,382 @@ class MultiAppMonitor:
                         f.write(f"  最后更新: {app['date'].strftime('%Y-%m-%d')}\n")
                     f.write("\n")
 
+        portfolio_files = self.write_portfolio(timestamp) if self.portfolio else None
+        metrics_file = self.write_metrics(f"batch_metrics_{timestamp}.jsonl")
+
         # 获取完整路径
         full_path = os.path.abspath(summary_file)
         print(f"\n📄 汇总已保存至:")
         print(f"   {full_path}")
+        print(f"📈 各阶段指标: {os.path.abspath(metrics_file)}")
+        if portfolio_files:
+            print(f"📊 组合分析: {os.path.abspath(portfolio_files[0])}")
+            print(f"   {os.path.abspath(portfolio_files[1])}")
         print("\n" + "=" * 80)
 
+    def write_portfolio(self, timestamp):
+        """
+        把所有已抓取应用的每日汇总合并为一个组合，写出组合分析表格和图表
+        返回: (表格文件, 图表文件)，没有可用数据时返回None
+        """
+        daily_stats = {app_id: result['daily_stats'] for app_id, result in self.results.items()
+                       if result.get('daily_stats') is not None and len(result['daily_stats'])}
+        if not daily_stats:
+            print("\n⚠️  没有可用于组合分析的应用数据")
+            return None
+
+        start = time.perf_counter()
+        portfolio = PortfolioAnalysis(daily_stats, {app_id: self.results[app_id]['app_name']
+                                                    for app_id in daily_stats})
+        table_file = portfolio.write_table(f"portfolio_{timestamp}.md")
+
+        extension, default_dpi = CHART_FORMATS[self.chart_format]
+        chart_file = portfolio.render_chart(f"portfolio_{timestamp}.{extension}", self.chart_format,
+                                            self.chart_dpi or default_dpi)
+        self.portfolio_seconds = time.perf_counter() - start
+
+        return table_file, chart_file
+
+    def write_metrics(self, metrics_file):
+        """
+        写出本批次的机器可读指标（JSON Lines）：每个应用一行，记录各阶段耗时和计数，
+        最后一行为整批的汇总
+        """
+        statuses = Counter(result['status'] for result in self.results.values())
+
+        with open(metrics_file, 'w', encoding='utf-8') as f:
+            for app_id, result in self.results.items():
+                metrics = result.get('metrics') or {'stages': {}, 'latencies': {}, 'counters': {}}
+                stages = {stage: round(seconds, 4) for stage, seconds in metrics['stages'].items()}
+                record = {
+                    'type': 'app',
+                    'app_id': app_id,
+                    'status': result['status'],
+                    'total_seconds': round(sum(metrics['stages'].values()), 4),
+                    'stages': stages,
+                    'latencies': {name: round(seconds, 4) for name, seconds in metrics['latencies'].items()},
+                    'counters': metrics['counters'],
+                }
+                fetch_seconds = metrics['stages'].get('fetch_reviews')
+                if fetch_seconds:
+                    record['reviews_per_second'] = round(metrics['counters'].get('reviews', 0) / fetch_seconds, 1)
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+            run_record = {
+                'type': 'run',
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'apps': len(self.results),
+                'wall_seconds': round(self.batch_seconds, 4) if self.batch_seconds is not None else None,
+                'statuses': dict(statuses),
+                'requests_per_second': self.rate_limiter.rate,
+                'circuit_breaker_trips': self.circuit_breaker.trips,
+            }
+            if self.portfolio_seconds is not None:
+                run_record['portfolio_seconds'] = round(self.portfolio_seconds, 4)
+            if self.gemini_cache is not None:
+                run_record['gemini_cache'] = {'hits': self.gemini_cache.hits, 'misses': self.gemini_cache.misses}
+            f.write(json.dumps(run_record, ensure_ascii=False) + "\n")
+
+        return metrics_file
+
+
+def load_daemon_config(path):
+    """
+    读取常驻模式的配置文件（JSON），示例:
+        {
+          "gemini_api_key": "...",
+          "analysis_mode": "update",
+          "interval_hours": 24,
+          "apps": [
+            "com.example.app1",
+            {"app_id": "com.example.app2", "interval_hours": 6, "analysis_mode": "recent", "recent_count": 200}
+          ]
+        }
+    未配置gemini_api_key时读取环境变量GEMINI_API_KEY
+    返回: (gemini_api_key, 应用配置列表)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    defaults = {
+        'analysis_mode': config.get('analysis_mode', 'update'),
+        'recent_count': config.get('recent_count', 100),
+        'interval_hours': config.get('interval_hours', DEFAULT_DAEMON_INTERVAL_HOURS),
+        'min_days': config.get('min_days', 7),
+        'max_days': config.get('max_days', 30),
+    }
+
+    apps = []
+    for entry in config.get('apps', []):
+        app_config = dict(defaults)
+        app_config.update({'app_id': entry} if isinstance(entry, str) else entry)
+
+        if not app_config.get('app_id'):
+            raise ValueError(f"应用配置缺少app_id: {entry}")
+        if app_config['analysis_mode'] not in ('update', 'recent'):
+            raise ValueError(f"{app_config['app_id']}: analysis_mode 必须是 update 或 recent")
+        if app_config['interval_hours'] <= 0:
+            raise ValueError(f"{app_config['app_id']}: interval_hours 必须大于0")
+        if app_config['analysis_mode'] == 'recent':
+            # 最近N条模式：不使用时间限制
+            app_config['min_days'], app_config['max_days'] = 0, 999999
+
+        apps.append(app_config)
+
+    if not apps:
+        raise ValueError("配置文件中没有应用（apps）")
+
+    gemini_api_key = config.get('gemini_api_key') or os.environ.get('GEMINI_API_KEY')
+
+    return gemini_api_key, apps
+
+
+class MonitorDaemon:
+    """
+    常驻调度模式：按配置文件中每个应用各自的间隔重复分析，无需交互输入
+    进程常驻，限速器、Gemini客户端、本地评论库连接、元数据缓存和Gemini结果缓存
+    在各轮之间复用，不必为每一轮重新启动进程和导入依赖
+    """
+
+    def __init__(self, apps, gemini_api_key=None, monitor_options=None,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND):
+        """
+        参数:
+            apps: load_daemon_config返回的应用配置列表
+            monitor_options: 传给每轮MultiAppMonitor的共享参数（store、缓存、并发数等）
+        """
+        self.apps = apps
+        self.gemini_api_key = gemini_api_key
+        self.monitor_options = monitor_options or {}
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.circuit_breaker = CircuitBreaker()
+        self.cycles = 0
+
+        # (下次运行时间, 序号, 应用配置) 小顶堆；启动时所有应用立即到期
+        now = time.time()
+        self._schedule = [(now, i, app_config) for i, app_config in enumerate(apps)]
+        heapq.heapify(self._schedule)
+
+    def run(self, once=False):
+        """
+        调度循环；once为True时只运行一轮到期的应用后返回
+        """
+        print(f"\n🕒 常驻模式已启动，共{len(self.apps)}个应用")
+
+        while True:
+            now = time.time()
+            due = []
+            while self._schedule and self._schedule[0][0] <= now:
+                due.append(heapq.heappop(self._schedule))
+
+            if due:
+                self.run_cycle([app_config for _, _, app_config in due])
+
+                finished_at = time.time()
+                for _, i, app_config in due:
+                    next_run = finished_at + app_config['interval_hours'] * 3600
+                    heapq.heappush(self._schedule, (next_run, i, app_config))
+
+            if once:
+                return
+
+            next_run = self._schedule[0][0]
+            print(f"下次检查: {datetime.fromtimestamp(next_run).strftime('%Y-%m-%d %H:%M:%S')}")
+            while time.time() < next_run:
+                time.sleep(min(DAEMON_MAX_SLEEP_SECONDS, max(0, next_run - time.time())))
+
+    def run_cycle(self, due_apps):
+        """
+        分析本轮到期的应用；分析参数相同的应用合并为一个批次
+        """
+        self.cycles += 1
+        print(f"\n{'=' * 80}")
+        print(f"第{self.cycles}轮检查: {len(due_apps)}个应用到期")
+        print("=" * 80)
+
+        groups = {}
+        for app_config in due_apps:
+            key = (app_config['analysis_mode'], app_config['recent_count'],
+                   app_config['min_days'], app_config['max_days'])
+            groups.setdefault(key, []).append(app_config['app_id'])
+
+        for (analysis_mode, recent_count, min_days, max_days), app_ids in groups.items():
+            multi_monitor = MultiAppMonitor(gemini_api_key=self.gemini_api_key, analysis_mode=analysis_mode,
+                                            recent_count=recent_count, rate_limiter=self.rate_limiter,
+                                            circuit_breaker=self.circuit_breaker, **self.monitor_options)
+            multi_monitor.app_ids = list(dict.fromkeys(app_ids))
+            multi_monitor.analyze_all_apps(min_days=min_days, max_days=max_days)
+
+
+def parse_args(argv=None):
+    """
+    解析命令行参数
+    """
+    parser = argparse.ArgumentParser(description="Google Play 舆情分析系统")
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.add_parser('check-deps', help="检查Python版本和依赖包，可选择自动安装缺失的包")
+    daemon_parser = subparsers.add_parser('daemon', help="常驻调度模式：按配置文件定期分析应用，无需交互输入")
+    daemon_parser.add_argument('--config', required=True, metavar='PATH',
+                               help="配置文件路径（JSON，包含应用列表和检查间隔）")
+    daemon_parser.add_argument('--once', action='store_true',
+                               help="只运行一轮后退出")
+    parser.add_argument('--count', type=int, default=100,
+                        help="最近N条模式下获取的评论条数（默认: 100）")
+    parser.add_argument('--locales', type=str, default=None, metavar='LIST',
+                        help="抓取的评论地区，逗号分隔的 语言-国家，如 en-us,pt-br,de-de（默认: en-us）")
+    parser.add_argument('--store', nargs='?', const=DEFAULT_STORE_PATH, default=None, metavar='PATH',
+                        help=f"启用本地评论库并增量同步（默认路径: {DEFAULT_STORE_PATH}）")
+    parser.add_argument('--snapshot', nargs='?', const=DEFAULT_SNAPSHOT_DIR, default=None, metavar='DIR',
+                        help=f"获取评论后保存列式快照，供之后离线重新分析（默认目录: {DEFAULT_SNAPSHOT_DIR}）")
+    parser.add_argument('--from-snapshot', nargs='?', const=DEFAULT_SNAPSHOT_DIR, default=None, metavar='DIR',
+                        help=f"从快照读取评论，不访问网络、不检查更新时间（默认目录: {DEFAULT_SNAPSHOT_DIR}）")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="同时抓取评论的应用数（默认: 1）")
+    parser.add_argument('--analyze-workers', type=int, default=DEFAULT_STAGE_WORKERS['analyze'],
+                        help=f"同时进行数据分析的应用数（默认: {DEFAULT_STAGE_WORKERS['analyze']}）")
+    parser.add_argument('--llm-workers', type=int, default=DEFAULT_STAGE_WORKERS['llm'],
+                        help=f"同时进行中的Gemini请求数上限（默认: {DEFAULT_STAGE_WORKERS['llm']}）")
+    parser.add_argument('--render-workers', type=int, default=DEFAULT_STAGE_WORKERS['render'],
+                        help=f"同时生成报告和图表的应用数（默认: {DEFAULT_STAGE_WORKERS['render']}）")
+    parser.add_argument('--render-processes', type=int, default=0,
+                        help="在N个子进程中渲染图表和Newsletter，不阻塞抓取（默认: 0，在主进程中渲染）")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_PIPELINE_QUEUE_SIZE,
+                        help=f"流水线阶段间队列长度，用于限制在途应用数（默认: {DEFAULT_PIPELINE_QUEUE_SIZE}）")
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help=f"全局网络请求速率上限，次/秒（默认: {DEFAULT_REQUESTS_PER_SECOND}）")
+    parser.add_argument('--retries', type=int, default=DEFAULT_MAX_RETRIES,
+                        help=f"网络请求失败后的最多重试次数，指数退避（默认: {DEFAULT_MAX_RETRIES}）")
+    parser.add_argument('--metadata-ttl', type=float, default=DEFAULT_METADATA_TTL_HOURS, metavar='HOURS',
+                        help=f"应用元数据缓存有效期，小时（默认: {DEFAULT_METADATA_TTL_HOURS}，0表示不使用缓存）")
+    parser.add_argument('--refresh-metadata', action='store_true',
+                        help="忽略缓存，强制重新获取应用元数据")
+    parser.add_argument('--ngram', type=int, default=1,
+                        help="高频关键词的词组长度，1为单词，2为双词组（默认: 1）")
+    parser.add_argument('--dedupe', nargs='?', type=float, const=DEDUPE_THRESHOLD, default=None,
+                        metavar='THRESHOLD',
+                        help=f"合并近似重复评论（MinHash/LSH），关键词和样本评论按组只计一次；"
+                             f"THRESHOLD为相似度下限（默认: {DEDUPE_THRESHOLD}）")
+    parser.add_argument('--streaming', action='store_true',
+                        help="流式分析：边获取边统计，内存占用固定（关键词为近似统计）")
+    parser.add_argument('--chart-format', choices=list(CHART_FORMATS), default='png',
+                        help="图表格式：png（300 DPI）、preview（72 DPI预览）、svg、html（轻量网页图表）（默认: png）")
+    parser.add_argument('--chart-dpi', type=int, default=None,
+                        help="覆盖图表格式的默认DPI（仅png/preview）")
+    parser.add_argument('--force-charts', action='store_true',
+                        help="即使图表数据未变化也重新渲染")
+    parser.add_argument('--portfolio', action='store_true',
+                        help="批量分析后输出所有应用的组合分析（统计、情感构成、每日趋势、排名变化）表格和图表")
+    parser.add_argument('--prompt-budget', type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET, metavar='TOKENS',
+                        help=f"Gemini prompt的token预算（估算），超出时截断样本评论（默认: {DEFAULT_PROMPT_TOKEN_BUDGET}）")
+    parser.add_argument('--gemini-timeout', type=float, default=DEFAULT_GEMINI_TIMEOUT, metavar='SECONDS',
+                        help=f"每个应用调用Gemini的时限（含重试），超时则生成不含AI分析的Newsletter"
+                             f"（默认: {DEFAULT_GEMINI_TIMEOUT}秒）")
+    parser.add_argument('--no-gemini-cache', action='store_true',
+                        help=f"不使用Gemini结果缓存（缓存目录: {DEFAULT_GEMINI_CACHE_DIR}）")
+    args = parser.parse_args(argv)
+
+    if args.count <= 0:
+        parser.error("--count 必须是正整数")
+    for option in ('ngram', 'workers', 'analyze_workers', 'llm_workers', 'render_workers', 'queue_size',
+                   'prompt_budget'):
+        if getattr(args, option) <= 0:
+            parser.error(f"--{option.replace('_', '-')} 必须是正整数")
+    if args.dedupe is not None and not 0 < args.dedupe <= 1:
+        parser.error("--dedupe 的相似度下限必须在0到1之间")
+    if args.gemini_timeout <= 0:
+        parser.error("--gemini-timeout 必须大于0")
+    if args.snapshot and args.from_snapshot:
+        parser.error("--snapshot 和 --from-snapshot 不能同时使用")
+    if args.locales is not None:
+        try:
+            args.locales = parse_locales(args.locales)
+        except ValueError as e:
+            parser.error(f"--locales {e}")
+    if args.retries < 0:
+        parser.error("--retries 不能为负数")
+    if args.render_processes < 0:
+        parser.error("--render-processes 不能为负数")
+    if args.rate <= 0:
+        parser.error("--rate 必须大于0")
+    if args.chart_dpi is not None and args.chart_dpi <= 0:
+        parser.error("--chart-dpi 必须是正整数")
+    if args.metadata_ttl < 0:
+        parser.error("--metadata-ttl 不能为负数")
+
+    return args
+
 
 # 主程序执行
 if __name__ == "__main__":
+    args = parse_args()
+
+    if args.command == 'check-deps':
+        check_and_install_dependencies()
+        sys.exit(0)
+
+    missing_packages = find_missing_dependencies()
+    if missing_packages:
+        print(f"❌ 缺少依赖包: {', '.join(missing_packages)}")
+        print("请运行 python play_store_monitor.py check-deps 检查并安装，或执行:")
+        print("  pip install -r requirements.txt")
+        sys.exit(1)
+
+    recent_count = args.count
+    # 本地库的按天关键词计数与分析使用同一个KeywordExtractor
+    keyword_extractor = KeywordExtractor(ngram=args.ngram)
+    store = ReviewStore(args.store, keyword_extractor=keyword_extractor) if args.store else None
+    metadata_cache = None
+    if args.metadata_ttl > 0:
+        metadata_cache = MetadataCache(ttl_hours=args.metadata_ttl, force_refresh=args.refresh_metadata)
+    gemini_cache = None if args.no_gemini_cache else GeminiCache()
+
+    # 各批次共享的监控参数
+    monitor_options = {
+        'store': store,
+        'max_workers': args.workers,
+        'metadata_cache': metadata_cache,
+        'gemini_cache': gemini_cache,
+        'stage_workers': {'analyze': args.analyze_workers,
+                          'llm': args.llm_workers,
+                          'render': args.render_workers},
+        'queue_size': args.queue_size,
+        'keyword_extractor': keyword_extractor,
+        'streaming': args.streaming,
+        'chart_format': args.chart_format,
+        'chart_dpi': args.chart_dpi,
+        'force_render': args.force_charts,
+        'render_processes': args.render_processes,
+        'snapshot_dir': args.from_snapshot or args.snapshot,
+        'from_snapshot': args.from_snapshot is not None,
+        'max_retries': args.retries,
+        'locales': args.locales,
+        'prompt_token_budget': args.prompt_budget,
+        'gemini_timeout': args.gemini_timeout,
+        'duplicate_detector': NearDuplicateDetector(args.dedupe) if args.dedupe is not None else None,
+        'portfolio': args.portfolio,
+    }
+
+    if args.command == 'daemon':
+        try:
+            gemini_api_key, daemon_apps = load_daemon_config(args.config)
+        except (OSError, ValueError) as e:
+            print(f"❌ 读取配置文件时出错: {e}")
+            sys.exit(1)
+
+        if not gemini_api_key:
+            print("⚠️  未配置API Key，将仅生成数据摘要")
+
+        daemon = MonitorDaemon(daemon_apps, gemini_api_key=gemini_api_key,
+                               monitor_options=monitor_options, requests_per_second=args.rate)
+        try:
+            daemon.run(once=args.once)
+        except KeyboardInterrupt:
+            print("\n常驻模式已停止。")
+        finally:
+            if store is not None:
+                store.close()
+        sys.exit(0)
+
     # 提示用户输入Gemini API Key
     print("\n" + "=" * 80)
     print("欢迎使用 Google Play 舆情分析系统")
@@ -893,7 +4456,7 @@ if __name__ == "__main__":
     print("选择分析模式")
     print("=" * 80)
     print("\n1. 更新后评论模式 - 分析应用最后更新后的所有评论（7-30天内更新的应用）")
-    print("2. 最近100条模式 - 分析应用最近的100条评论（不考虑更新日期）")
+    print(f"2. 最近{recent_count}条模式 - 分析应用最近的{recent_count}条评论（不考虑更新日期，可用 --count 调整）")
 
     while True:
         mode_choice = input("\n请选择模式 (1 或 2): ").strip()
@@ -903,13 +4466,15 @@ if __name__ == "__main__":
             break
         elif mode_choice == '2':
             analysis_mode = 'recent'
-            print("✓ 已选择：最近100条模式")
+            print(f"✓ 已选择：最近{recent_count}条模式")
             break
         else:
             print("❌ 无效输入，请输入 1 或 2")
 
     # 创建多应用监控器，传入API Key和分析模式
-    multi_monitor = MultiAppMonitor(gemini_api_key=gemini_api_key, analysis_mode=analysis_mode)
+    multi_monitor = MultiAppMonitor(gemini_api_key=gemini_api_key, analysis_mode=analysis_mode,
+                                    recent_count=recent_count, requests_per_second=args.rate,
+                                    **monitor_options)
 
     # 提示用户输入应用ID
     if multi_monitor.prompt_for_apps():
@@ -918,7 +4483,10 @@ if __name__ == "__main__":
             # 更新模式：使用7-30天限制
             multi_monitor.analyze_all_apps(min_days=7, max_days=30)
         else:
-            # 最近100条模式：不使用时间限制
+            # 最近N条模式：不使用时间限制
             multi_monitor.analyze_all_apps(min_days=0, max_days=999999)
 
+    if store is not None:
+        store.close()
+
     print("\n✅ 全部完成！")
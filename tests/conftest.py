@@ -0,0 +1,9 @@
+"""
+pytest配置：把仓库根目录和benchmarks目录加入导入路径，测试直接导入 play_store_monitor 和 fake_services
+"""
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'benchmarks'))
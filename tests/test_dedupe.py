@@ -0,0 +1,48 @@
+"""
+NearDuplicateDetector 和 ReviewAnalysis 近似重复合并的回归测试
+"""
+import time
+
+import pytest
+
+from play_store_monitor import NearDuplicateDetector, Review, ReviewAnalysis
+
+
+@pytest.mark.parametrize('contents, expected', [
+    ([], []),
+    (["only one review"], [0]),
+    (["the app keeps crashing on start", "the app keeps crashing on start"], [0, 0]),
+    (["the app keeps crashing on start", "great puzzles and no ads at all"], [0, 1]),
+])
+def test_groups_small_inputs(contents, expected):
+    detector = NearDuplicateDetector()
+
+    assert detector.groups(contents).tolist() == expected
+    assert detector.groups(contents, weights=[0] * len(contents)).tolist() == expected
+
+
+def test_groups_weighted_representative():
+    detector = NearDuplicateDetector()
+    contents = ["the app keeps crashing on start"] * 3 + ["great puzzles and no ads at all"]
+
+    assert detector.groups(contents, weights=[1, 5, 2, 0]).tolist() == [1, 1, 1, 3]
+
+
+def test_groups_embedded_nul():
+    detector = NearDuplicateDetector()
+
+    assert detector.groups(["a\0b c", "x y", "z"]).tolist() == [0, 1, 2]
+    assert detector.groups(["a b", "\0", "a b", "z\0\0"]).tolist() == [0, 1, 0, 3]
+
+
+@pytest.mark.parametrize('count', [0, 1, 2])
+def test_review_analysis_with_dedupe(count):
+    now = int(time.time())
+    reviews = [Review(f'r{index}', "the app keeps crashing on start", 1, index, now - index, 'en-us')
+               for index in range(count)]
+
+    analysis = ReviewAnalysis(reviews, duplicate_detector=NearDuplicateDetector())
+
+    assert analysis.total_reviews == count
+    if count:
+        assert analysis.to_analysis_dict()['total_reviews'] == count
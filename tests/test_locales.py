@@ -0,0 +1,86 @@
+"""
+多地区抓取的回归测试：同一评论出现在多个地区时的归属、各分析路径（内存、流式、本地库汇总表）的一致性
+"""
+import time
+
+import pytest
+
+import play_store_monitor
+from fake_services import FakeServices
+from play_store_monitor import PlayStoreMonitor, ReviewStore
+
+LOCALES = [('en', 'us'), ('pt', 'br')]
+
+
+class LocaleServices(FakeServices):
+    """
+    各地区的评论：下标能被3整除的评论所有地区共享，其余评论的reviewId带地区后缀；
+    第一个地区每页多等待一会儿，让后配置的地区先产出共享的评论
+    """
+
+    def reviews(self, app_id, lang='en', country='us', count=100, continuation_token=None):
+        if (lang, country) == LOCALES[0]:
+            time.sleep(0.01)
+
+        page, token = super().reviews(app_id, lang, country, count, continuation_token)
+        for review in page:
+            if int(review['reviewId'].rsplit(':', 1)[1]) % 3:
+                review['reviewId'] += f':{country}'
+
+        return page, token
+
+
+@pytest.fixture
+def services(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    services = LocaleServices(reviews_per_app=600, page_size=100)
+    monkeypatch.setattr(play_store_monitor, 'fetch_app_details', services.app)
+    monkeypatch.setattr(play_store_monitor, 'fetch_review_page', services.reviews)
+
+    return services
+
+
+def make_monitor(backend, tmp_path, **kwargs):
+    if backend == 'streaming':
+        kwargs['streaming'] = True
+    elif backend == 'rollup':
+        kwargs['store'] = ReviewStore(str(tmp_path / 'reviews.db'))
+    elif backend == 'store':
+        kwargs['store'] = ReviewStore(str(tmp_path / 'reviews.db'))
+        kwargs['snapshot_dir'] = str(tmp_path / 'snapshots')
+
+    return PlayStoreMonitor('com.example.app', locales=LOCALES, **kwargs)
+
+
+def reviews_by_locale(monitor):
+    assert monitor.fetch_reviews_for_analysis() == 'proceed'
+    analysis, _ = monitor.analyze_reviews()
+
+    return {locale: stats['reviews'] for locale, stats in analysis['locale_breakdown'].items()}
+
+
+@pytest.mark.parametrize('backend', ['memory', 'streaming', 'rollup', 'store'])
+def test_shared_reviews_credit_first_locale(services, tmp_path, backend):
+    for _ in range(2):
+        monitor = make_monitor(backend, tmp_path)
+        assert reviews_by_locale(monitor) == {'en-us': 600, 'pt-br': 400}
+
+
+@pytest.mark.parametrize('backend', ['memory', 'streaming', 'rollup', 'store'])
+def test_recent_mode_analyzes_recent_count_reviews(services, tmp_path, backend):
+    monitor = make_monitor(backend, tmp_path, analysis_mode='recent', recent_count=500)
+
+    assert reviews_by_locale(monitor) == {'en-us': 300, 'pt-br': 200}
+    assert monitor.review_analysis.total_reviews == 500
+    assert monitor.metrics['counters']['reviews'] == 500
+
+
+def test_merged_pages_are_newest_first(services, tmp_path):
+    monitor = make_monitor('memory', tmp_path)
+    monitor.get_last_update_date()
+    reviews = [review for page in monitor.iter_locale_pages(monitor.iter_reviews_after_update) for review in page]
+
+    keys = [(review.at, review.review_id) for review in reviews]
+    assert keys == sorted(keys, reverse=True)
+    assert len({review.review_id for review in reviews}) == len(reviews) == 1000
+    assert monitor.metrics['counters']['duplicate_reviews'] == 200
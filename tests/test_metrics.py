@@ -0,0 +1,36 @@
+"""
+批量指标（batch_metrics JSONL）的回归测试
+"""
+import json
+
+import pytest
+
+import play_store_monitor
+from fake_services import FakeGeminiModel, FakeServices
+from play_store_monitor import MultiAppMonitor
+
+
+@pytest.fixture
+def services(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    services = FakeServices(reviews_per_app=200, gemini_latency=0.05)
+    monkeypatch.setattr(play_store_monitor, 'fetch_app_details', services.app)
+    monkeypatch.setattr(play_store_monitor, 'fetch_review_page', services.reviews)
+    monkeypatch.setattr(play_store_monitor, 'create_gemini_model', lambda api_key: FakeGeminiModel(services))
+
+    return services
+
+
+def test_first_token_latency_is_not_counted_in_total(services, tmp_path):
+    monitor = MultiAppMonitor(gemini_api_key='offline-test', chart_format='html')
+    monitor.app_ids = ['com.example.app']
+    monitor.analyze_all_apps()
+
+    with open(monitor.write_metrics(str(tmp_path / 'metrics.jsonl')), encoding='utf-8') as f:
+        app_record, run_record = [json.loads(line) for line in f]
+
+    assert app_record['status'] == 'success'
+    assert run_record['type'] == 'run'
+    assert 'gemini_first_token' not in app_record['stages']
+    assert 0 < app_record['latencies']['gemini_first_token'] <= app_record['stages']['gemini']
+    assert app_record['total_seconds'] == pytest.approx(sum(app_record['stages'].values()), abs=1e-3)
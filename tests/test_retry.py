@@ -0,0 +1,53 @@
+"""
+call_with_retry 错误分类的回归测试：永久性错误不重试，也不计入批次共享的熔断器和限速器
+"""
+import pytest
+from google_play_scraper.exceptions import NotFoundError
+
+import play_store_monitor
+from fake_services import FakeServices
+from play_store_monitor import CircuitBreaker, PlayStoreMonitor, RateLimiter, RetryPolicy
+
+
+@pytest.fixture
+def shared():
+    return {
+        'rate_limiter': RateLimiter(100),
+        'circuit_breaker': CircuitBreaker(window=4),
+        'retry_policy': RetryPolicy(max_retries=3, base_delay=0.001, max_delay=0.001),
+    }
+
+
+def test_missing_app_is_not_retried(monkeypatch, shared):
+    calls = []
+
+    def missing_app(app_id):
+        calls.append(app_id)
+        raise NotFoundError("App not found(404).")
+
+    monkeypatch.setattr(play_store_monitor, 'fetch_app_details', missing_app)
+
+    for index in range(5):
+        monitor = PlayStoreMonitor(f'com.example.stale{index}', **shared)
+        assert monitor.get_last_update_date() is None
+        assert monitor.metrics['counters']['retries'] == 0
+
+    assert len(calls) == 5
+    assert shared['circuit_breaker'].trips == 0
+    assert shared['rate_limiter'].rate == shared['rate_limiter'].max_rate
+
+
+def test_transient_error_is_retried(monkeypatch, shared):
+    services = FakeServices()
+    failures = [ConnectionError("connection reset")]
+
+    def flaky_app(app_id):
+        if failures:
+            raise failures.pop()
+        return services.app(app_id)
+
+    monkeypatch.setattr(play_store_monitor, 'fetch_app_details', flaky_app)
+
+    monitor = PlayStoreMonitor('com.example.app', **shared)
+    assert monitor.get_last_update_date() is not None
+    assert monitor.metrics['counters']['retries'] == 1